@@ -6,10 +6,18 @@ from datetime import datetime
 import pytz
 import traceback
 
-from config import TELEGRAM_TOKEN, ADMIN_USER_ID
+from config import (TELEGRAM_TOKEN, ADMIN_USER_ID, SOLVER_METHOD, SOLVER_BEAM_WIDTH,
+                    SOLVER_SCRATCH_DIR, SOLVER_INLINE_TIME_LIMIT, SOLVER_NODE_LIMIT,
+                    SOLVER_METRICS_LOG, SOLVER_TRACE_MEMORY)
 from database import db
 from languages import LANGUAGES
 from colors import COLOR_SYSTEM, get_color_emoji
+from core.puzzle import PuzzleState
+from core.solver import PuzzleSolver
+from core.cache import solution_cache
+from core.metrics import log_metrics
+from solver_service import submit_solve, get_service_stats
+from utils.validators import check_solvable
 from keyboards import (
     get_language_keyboard,
     get_bottles_keyboard,
@@ -101,6 +109,45 @@ def get_bottle_display(bottle_colors):
     
     return ' '.join(display)
 
+def get_manual_bottles(session):
+    """زجاجات اللغز المدخل يدوياً مع الزجاجات الفارغة"""
+    bottles = [list(bottle) for bottle in session.get('bottles', [])]
+    bottles += [['EMPTY'] * 4 for _ in range(session.get('empty_bottles', 0))]
+    return bottles
+
+def solve_manual_puzzle(session):
+    """حل اللغز المدخل يدوياً وإرجاع خطوات الحل (أو None)"""
+    solver = PuzzleSolver(
+        PuzzleState(get_manual_bottles(session)),
+        method=SOLVER_METHOD,
+        beam_width=SOLVER_BEAM_WIDTH,
+        scratch_dir=SOLVER_SCRATCH_DIR,
+        time_limit=SOLVER_INLINE_TIME_LIMIT,
+        node_limit=SOLVER_NODE_LIMIT,
+        cache=solution_cache,
+        metrics_sink=log_metrics if SOLVER_METRICS_LOG else None,
+        trace_memory=SOLVER_TRACE_MEMORY
+    )
+    if solver.solve() is None:
+        return None
+    return solver.get_solution_steps()
+
+def format_solution_message(steps, lang_data):
+    """تنسيق خطوات الحل في رسالة واحدة"""
+    lines = [
+        f"🎉 *{lang_data['solution_found']}*",
+        "",
+        f"⏱️ *{len(steps)} {lang_data['steps']}*",
+        ""
+    ]
+    for step in steps:
+        emoji = get_color_emoji(step['color'])
+        lines.append(f"{step['step']}. صب {emoji} من #{step['from'] + 1} → #{step['to'] + 1}")
+    
+    lines.append("")
+    lines.append(f"{lang_data['next_game']}: /start")
+    return '\n'.join(lines)
+
 @app.route('/')
 def home():
     stats = db.get_daily_stats()
@@ -375,16 +422,28 @@ def handle_callback_query(callback):
                     
                     send_telegram_message(chat_id, summary)
                     
-                    # هنا سنضيف خوارزمية الحل لاحقاً
-                    # مؤقتاً نرسل رسالة تجريبية
-                    import time
-                    time.sleep(2)
-                    
-                    send_telegram_message(
-                        chat_id,
-                        f"🎉 *{lang_data['solution_found']}*\n\n⏱️ *12 {lang_data['steps']}*\n\n1. صب 🔴 من #1 → #3\n2. صب 🔵 من #2 → #5\n...\n\n{lang_data['next_game']}: /start",
-                        get_color_keyboard(language, session)
-                    )
+                    # إرسال اللغز لخدمة الحل المشتركة (الحل يصل منها مباشرة)
+                    # وإذا لم تكن الخدمة تعمل يُحل داخل الطلب
+                    bottles = get_manual_bottles(session)
+                    is_valid, reason = check_solvable(bottles)
+                    if not is_valid:
+                        send_telegram_message(
+                            chat_id,
+                            f"{lang_data['error']}: {reason}\n\n{lang_data['next_game']}: /start"
+                        )
+                    elif not submit_solve(chat_id, bottles, language, priority=len(bottles)):
+                        steps = solve_manual_puzzle(session)
+                        
+                        if steps is None:
+                            send_telegram_message(
+                                chat_id,
+                                f"{lang_data['error']}\n\n{lang_data['next_game']}: /start"
+                            )
+                        else:
+                            send_telegram_message(
+                                chat_id,
+                                format_solution_message(steps, lang_data)
+                            )
         
         elif callback_data.startswith('colors_page_'):
             # التنقل بين صفحات الألوان
@@ -460,6 +519,17 @@ def handle_message(message):
             flag = LANGUAGES.get(lang_code, {}).get('flag', '')
             stats_text += f"• {flag} {lang_name}: {count}\n"
         
+        service_stats = get_service_stats()
+        cache_stats = service_stats['cache'] if service_stats else solution_cache.get_stats()
+        stats_text += f"""
+🧠 ذاكرة الحلول:
+• إصابات (ذاكرة/قرص): {cache_stats['memory_hits']}/{cache_stats['disk_hits']}
+• إخفاقات: {cache_stats['misses']}
+• نسبة الإصابة: {cache_stats['hit_rate']:.1f}%
+"""
+        if service_stats:
+            stats_text += f"⚙️ خدمة الحل: {service_stats['running']} قيد الحل، {service_stats['queued']} في الانتظار\n"
+        
         send_telegram_message(chat_id, stats_text)
     
     elif text == '/users' and str(user_id) == ADMIN_USER_ID:
@@ -541,6 +611,8 @@ def set_webhook():
 def admin_dashboard():
     """لوحة تحكم المالك"""
     stats = db.get_daily_stats()
+    service_stats = get_service_stats()
+    cache_stats = service_stats['cache'] if service_stats else solution_cache.get_stats()
     
     html = f"""
     <!DOCTYPE html>
@@ -583,6 +655,28 @@ def admin_dashboard():
                 </div>
             </div>
             
+            <div class="card">
+                <h2>🧠 ذاكرة الحلول</h2>
+                <div class="stats-grid">
+                    <div class="stat-box">
+                        <div class="stat-number">{cache_stats['memory_hits'] + cache_stats['disk_hits']}</div>
+                        <div class="stat-label">إصابات ({cache_stats['memory_hits']} ذاكرة / {cache_stats['disk_hits']} قرص)</div>
+                    </div>
+                    <div class="stat-box">
+                        <div class="stat-number">{cache_stats['misses']}</div>
+                        <div class="stat-label">إخفاقات</div>
+                    </div>
+                    <div class="stat-box">
+                        <div class="stat-number">{cache_stats['hit_rate']:.1f}%</div>
+                        <div class="stat-label">نسبة الإصابة</div>
+                    </div>
+                    <div class="stat-box">
+                        <div class="stat-number">{cache_stats['memory_entries']}</div>
+                        <div class="stat-label">حلول في الذاكرة</div>
+                    </div>
+                </div>
+            </div>
+            
             <div class="card">
                 <h2>🌍 توزيع اللغات</h2>
     """
@@ -1,12 +1,17 @@
-from telegram import Update
+from telegram import Update, InputMediaPhoto
 from telegram.ext import ContextTypes
-import os
+import asyncio
 from core.image_processor import ImageProcessor
 from core.puzzle import PuzzleState
 from core.solver import PuzzleSolver
+from core.cache import solution_cache, layout_cache
+from core.metrics import log_metrics
 from core.visualizer import PuzzleVisualizer
-from utils.helpers import create_temp_file, resize_image, format_move_description
-from utils.validators import validate_puzzle_state
+from config import (SOLVER_METHOD, SOLVER_BEAM_WIDTH, SOLVER_SCRATCH_DIR, SOLVER_TIME_LIMIT,
+                    SOLVER_NODE_LIMIT, SOLVER_PROGRESS_INTERVAL, HINT_TIME_LIMIT,
+                    SOLVER_METRICS_LOG, SOLVER_TRACE_MEMORY)
+from utils.helpers import create_temp_file, format_move_description
+from utils.validators import validate_puzzle_state, check_solvable
 from .keyboards import get_main_menu_keyboard, get_confirmation_keyboard, get_solution_controls_keyboard
 from .states import UserState, UserSession
 
@@ -61,28 +66,24 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔍 جاري تحليل الصورة...")
     
     try:
-        # تحميل الصورة
+        # تحميل الصورة في الذاكرة وتحليلها مباشرة بدون ملفات مؤقتة
         photo_file = await update.message.photo[-1].get_file()
-        temp_path = create_temp_file('.jpg')
-        await photo_file.download_to_drive(temp_path)
-        
-        # تغيير حجم الصورة للحفاظ على الذاكرة
-        resized_path = resize_image(temp_path)
+        photo_bytes = await photo_file.download_as_bytearray()
         
         # معالجة الصورة
-        processor = ImageProcessor()
-        puzzle_data = processor.process_image(resized_path)
+        processor = ImageProcessor(layout_cache=layout_cache)
+        puzzle_data = processor.process_image(photo_bytes)
         
         # التحقق من الحالة
         is_valid, message = validate_puzzle_state(puzzle_data)
+        if is_valid:
+            is_valid, message = check_solvable(puzzle_data)
         if not is_valid:
             await update.message.reply_text(f"❌ {message}\nالرجاء إرسال صورة أوضح.")
-            os.remove(resized_path)
             return
         
         # حفظ الحالة
         session.puzzle_state = PuzzleState(puzzle_data)
-        session.puzzle_image_path = resized_path
         session.state = UserState.IMAGE_RECEIVED
         
         # إنشاء صورة التأكيد
@@ -103,7 +104,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         
         session.state = UserState.CONFIRMING_PUZZLE
-        
+    
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ في معالجة الصورة: {str(e)}")
         session.state = UserState.WAITING_FOR_IMAGE
@@ -120,22 +121,91 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         if session.state == UserState.CONFIRMING_PUZZLE and session.puzzle_state:
             await query.edit_message_caption("⏳ جاري البحث عن الحل...")
             
-            # حل اللغز
-            solver = PuzzleSolver(session.puzzle_state)
-            solution_path = solver.solve()
+            # حل اللغز في خيط منفصل حتى لا يتوقف البوت، مع تحديث الرسالة بالتقدم
+            loop = asyncio.get_running_loop()
+            progress_edits = []
+            
+            def report_progress(progress):
+                caption = (
+                    "⏳ جاري البحث عن الحل...\n\n"
+                    f"🔎 الحالات: {progress['nodes']:,}\n"
+                    f"📚 قيد الانتظار: {progress['frontier']:,}\n"
+                    f"📏 العمق: {progress['depth']}"
+                )
+                progress_edits.append(asyncio.run_coroutine_threadsafe(query.edit_message_caption(caption), loop))
+            
+            solver = PuzzleSolver(
+                session.puzzle_state,
+                method=SOLVER_METHOD,
+                beam_width=SOLVER_BEAM_WIDTH,
+                scratch_dir=SOLVER_SCRATCH_DIR,
+                time_limit=SOLVER_TIME_LIMIT,
+                node_limit=SOLVER_NODE_LIMIT,
+                progress_callback=report_progress,
+                progress_interval=SOLVER_PROGRESS_INTERVAL,
+                cache=solution_cache,
+                metrics_sink=log_metrics if SOLVER_METRICS_LOG else None,
+                trace_memory=SOLVER_TRACE_MEMORY
+            )
+            solution_path = await asyncio.to_thread(solver.solve)
+            
+            # إلغاء تحديثات التقدم المتأخرة حتى لا تستبدل الرسالة النهائية
+            for edit in progress_edits:
+                edit.cancel()
+            await asyncio.gather(*(asyncio.wrap_future(edit) for edit in progress_edits), return_exceptions=True)
             
             if not solution_path:
-                await query.edit_message_caption("❌ لم أتمكن من إيجاد حل لهذا اللغز.")
+                if solver.stats.get('budget_exhausted'):
+                    # نفاد الوقت لا يعني أن اللغز بلا حل
+                    await query.edit_message_caption(
+                        "⌛ انتهى وقت البحث قبل إيجاد حل. اللغز كبير جداً وقد يكون له حل."
+                    )
+                else:
+                    await query.edit_message_caption("❌ لم أتمكن من إيجاد حل لهذا اللغز.")
                 session.reset()
                 return
             
+            if not solver.optimal:
+                await query.edit_message_caption(
+                    f"⚠️ وجدت حلاً من {len(solution_path)} خطوة لكنه قد لا يكون الأقصر "
+                    f"(أطول من الحد الأدنى بـ {solver.stats.get('gap', '?')} خطوة على الأكثر)."
+                )
+            
             session.solution = solver.get_solution_steps()
             session.state = UserState.SHOWING_SOLUTION
             session.current_step = 0
+            session.last_message_id = None
             
             # إرسال أول خطوة
             await send_solution_step(update, context, session)
+        
+        else:
+            await query.edit_message_caption("❌ لم أجد حالة لغز. الرجاء إرسال صورة أولاً.")
+    
+    elif query.data == 'hint':
+        if session.state == UserState.CONFIRMING_PUZZLE and session.puzzle_state:
+            # الحركة التالية فقط بمهلة قصيرة، ثم نفترض أن المستخدم لعبها
+            solver = PuzzleSolver(session.puzzle_state, cache=solution_cache)
+            move = await asyncio.to_thread(solver.hint, HINT_TIME_LIMIT)
+            if move is None:
+                await query.edit_message_caption("❌ لا توجد حركة تقود للحل من هذه الحالة.")
+                session.reset()
+                return
+            
+            color = session.puzzle_state.get_top_color(move[0])
+            session.puzzle_state.pour(*move)
+            session.current_step += 1
+            description = format_move_description(session.current_step, move[0], move[1], color)
             
+            if session.puzzle_state.is_sorted():
+                await query.edit_message_caption(f"**{description}**\n\n🎉 **تم حل اللغز بالكامل!**", parse_mode='Markdown')
+                session.reset()
+            else:
+                await query.edit_message_caption(
+                    f"**{description}**\n\nاضغط للحركة التالية أو لعرض الحل الكامل من هنا.",
+                    reply_markup=get_confirmation_keyboard(),
+                    parse_mode='Markdown'
+                )
         else:
             await query.edit_message_caption("❌ لم أجد حالة لغز. الرجاء إرسال صورة أولاً.")
     
@@ -152,6 +222,11 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
                 await query.edit_message_caption("🎉 **تم حل اللغز بالكامل!**\n\nاستخدم /start للعبة جديدة.")
                 session.reset()
     
+    elif query.data == 'prev_step':
+        if session.state == UserState.SHOWING_SOLUTION and session.current_step > 0:
+            session.current_step -= 1
+            await send_solution_step(update, context, session)
+    
     elif query.data == 'stop_solution':
         await query.edit_message_caption("⏹️ توقفت عن عرض الحل.\nاستخدم /start للعبة جديدة.")
         session.reset()
@@ -191,7 +266,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         
         **كيف يعمل:**
         1. يحلل صورة اللغز باستخدام الذكاء الاصطناعي
-        2. يستخدم خوارزمية BFS لإيجاد أقصر حل
+        2. يستخدم خوارزمية A* لإيجاد أقصر حل
         3. يعرض النتائج خطوة بخطوة
         
         **المطور:** @your_username
@@ -204,7 +279,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         session.state = UserState.WAITING_FOR_IMAGE
 
 async def send_solution_step(update, context, session):
-    """إرسال خطوة من الحل"""
+    """إرسال خطوة من الحل (تُبنى من أقرب نقطة حفظ)"""
     step_info = session.solution[session.current_step]
     
     # إنشاء صورة الخطوة
@@ -234,12 +309,12 @@ async def send_solution_step(update, context, session):
     
     # إرسال الصورة
     with open(step_path, 'rb') as photo:
-        if session.current_step == 0:
+        if session.last_message_id is None:
             # أول رسالة
             message = await update.callback_query.message.reply_photo(
                 photo=photo,
                 caption=caption,
-                reply_markup=get_solution_controls_keyboard(),
+                reply_markup=get_solution_controls_keyboard(session.current_step > 0),
                 parse_mode='Markdown'
             )
             session.last_message_id = message.message_id
@@ -254,7 +329,7 @@ async def send_solution_step(update, context, session):
                 chat_id=update.effective_chat.id,
                 message_id=session.last_message_id,
                 caption=caption,
-                reply_markup=get_solution_controls_keyboard(),
+                reply_markup=get_solution_controls_keyboard(session.current_step > 0),
                 parse_mode='Markdown'
             )
 
@@ -13,15 +13,19 @@ def get_confirmation_keyboard():
     """لوحة تأكيد اللغز"""
     keyboard = [
         [InlineKeyboardButton("✅ نعم، ابدأ الحل", callback_data='confirm_solve')],
+        [InlineKeyboardButton("💡 الحركة التالية فقط", callback_data='hint')],
         [InlineKeyboardButton("❌ لا، أعد المحاولة", callback_data='retry')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_solution_controls_keyboard():
+def get_solution_controls_keyboard(has_previous=False):
     """أزرار التحكم بعرض الحل"""
+    navigation = [InlineKeyboardButton("⏭️ التالي", callback_data='next_step')]
+    if has_previous:
+        navigation.insert(0, InlineKeyboardButton("⏮️ السابق", callback_data='prev_step'))
     keyboard = [
-        [InlineKeyboardButton("⏭️ التالي", callback_data='next_step'),
-         InlineKeyboardButton("⏹️ إيقاف", callback_data='stop_solution')],
+        navigation,
+        [InlineKeyboardButton("⏹️ إيقاف", callback_data='stop_solution')],
         [InlineKeyboardButton("📋 كل الخطوات", callback_data='all_steps')]
     ]
     return InlineKeyboardMarkup(keyboard)
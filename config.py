@@ -7,3 +7,49 @@ ADMIN_USER_ID = os.environ.get('ADMIN_USER_ID', '5730502448')
 MIN_BOTTLES = 5
 MAX_BOTTLES = 20
 BOTTLE_CAPACITY = 4
+
+# خوارزمية الحل: 'bfs' أو 'astar' أو 'ida' أو 'vector'
+# أو 'external' (BFS على القرص للألغاز التي لا تكفيها الذاكرة)
+# أو 'beam' (سريع للألغاز الكبيرة بدون ضمان الأقصر)
+# أو 'portfolio' (عدة محركات بالتوازي وأول حل أمثل يفوز)
+SOLVER_METHOD = 'astar'
+SOLVER_BEAM_WIDTH = 500  # عرض الشعاع مع 'beam': أكبر = حل أقصر وأبطأ
+SOLVER_SCRATCH_DIR = os.environ.get('SOLVER_SCRATCH_DIR')  # ملفات 'external' (None = مجلد النظام المؤقت)
+
+# ميزانية البحث: عند تجاوزها يُعاد أفضل حل غير أمثل
+SOLVER_TIME_LIMIT = 60  # ثانية
+# الحل المباشر داخل طلب الويب (عند توقف خدمة الحل) يجب أن ينتهي قبل مهلة
+# عامل gunicorn (30 ثانية) مع الحل البديل، وإلا يُقتل العامل ويعيد تلجرام الطلب
+SOLVER_INLINE_TIME_LIMIT = 15  # ثانية
+SOLVER_NODE_LIMIT = 2_000_000
+SOLVER_PROGRESS_INTERVAL = 3  # ثوانٍ بين تحديثات رسالة التقدم
+HINT_TIME_LIMIT = 0.5  # ثانية لإيجاد الحركة التالية فقط
+
+# إحصائيات كل حل في السجل كسطر JSON، وذروة الذاكرة بـ tracemalloc (أبطأ)
+SOLVER_METRICS_LOG = os.environ.get('SOLVER_METRICS_LOG', '0') == '1'
+SOLVER_TRACE_MEMORY = os.environ.get('SOLVER_TRACE_MEMORY', '0') == '1'
+
+# ذاكرة الحلول المؤقتة (في الذاكرة + على القرص)
+SOLUTION_CACHE_DIR = 'solutions_cache'
+SOLUTION_CACHE_SIZE = 1000  # عدد الحلول في الذاكرة
+
+# أقصى بعد (بكسل) للصورة قبل التحليل
+IMAGE_MAX_SIZE = 1024
+
+# جدول بحث الألوان لتحليل الصور: بتات لكل قناة (5 = 32×32×32)، يُبنى مرة ويُحفظ
+COLOR_LUT_FILE = 'color_lut.npz'
+COLOR_LUT_BITS = 5
+
+# مواقع الزجاجات المحفوظة لأشكال الشاشات المتكررة
+LAYOUT_CACHE_SIZE = 100
+LAYOUT_SIGNATURE_TOLERANCE = 0.1  # نسبة بتات البصمة المسموح اختلافها لنفس الشكل
+
+# خطوات الحل: نسخة من اللغز كل عدد من الخطوات، والباقي يُعاد بناؤه عند الطلب
+SOLUTION_CHECKPOINT_INTERVAL = 16
+
+# خدمة الحل المشتركة (solver_service.py)
+# تعمل في نفس الخادم مع gunicorn (سطر web في procfile يشغلها في الخلفية قبله)
+# لأن Unix socket لا يصل بين خوادم منفصلة. إذا لم تعمل الخدمة يُحل اللغز مباشرة.
+SOLVER_SOCKET = os.environ.get('SOLVER_SOCKET', '/tmp/colorsort_solver.sock')
+SOLVER_WORKERS = int(os.environ.get('SOLVER_WORKERS', 0)) or None  # None = عدد الأنوية
+SOLVER_REQUEST_TIMEOUT = 5  # ثوانٍ لانتظار رد الخدمة على طلب أُرسل
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from config import SOLUTION_CACHE_DIR, SOLUTION_CACHE_SIZE, LAYOUT_CACHE_SIZE, LAYOUT_SIGNATURE_TOLERANCE
+
+
+class SolutionCache:
+    """ذاكرة مؤقتة للحلول بمفتاح بصمة اللغز
+    
+    طبقتان: LRU في الذاكرة وملف JSON لكل لغز على القرص يبقى بعد إعادة التشغيل.
+    البصمة لا تتغير بتغيير ترتيب الزجاجات أو أسماء الألوان، لذلك الحركات
+    تُخزن بأرقام الترتيب القياسي وتُحوّل لأرقام الزجاجات الحقيقية عند القراءة.
+    """
+    
+    def __init__(self, directory=SOLUTION_CACHE_DIR, max_entries=SOLUTION_CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'rejected': 0,  # حلول محفوظة فشلت عند إعادة التشغيل
+            'stores': 0
+        }
+    
+    def fingerprint(self, state):
+        """بصمة اللغز وترتيب الزجاجات القياسي
+        
+        يعيد (البصمة، order) حيث order[k] هو رقم الزجاجة الحقيقية التي
+        تقع في الموضع k من الترتيب القياسي.
+        """
+        # محتوى كل زجاجة من الأسفل للأعلى بدون الفراغات
+        bottles = [
+            tuple(color for color in reversed(bottle) if color and color != 'EMPTY')
+            for bottle in state.bottles
+        ]
+        
+        # وصف كل لون لا يعتمد على اسمه: مواقع ظهوره وارتفاع زجاجاته
+        profiles = {}
+        for bottle in bottles:
+            for layer, color in enumerate(bottle):
+                profiles.setdefault(color, []).append((layer, len(bottle)))
+        profiles = {color: tuple(sorted(places)) for color, places in profiles.items()}
+        
+        # ترتيب مبدئي للزجاجات حسب أوصاف ألوانها، ثم ترقيم الألوان بترتيب ظهورها
+        shaped = sorted(range(len(bottles)),
+                        key=lambda idx: tuple(profiles[color] for color in bottles[idx]))
+        labels = {}
+        for idx in shaped:
+            for color in bottles[idx]:
+                if color not in labels:
+                    labels[color] = len(labels)
+        
+        relabeled = [tuple(labels[color] for color in bottle) for bottle in bottles]
+        order = sorted(range(len(bottles)), key=relabeled.__getitem__)
+        canonical = [relabeled[idx] for idx in order]
+        
+        payload = json.dumps([state.capacity, canonical], separators=(',', ':'))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest(), order
+    
+    def get(self, state):
+        """إرجاع حركات الحل المحفوظ بأرقام زجاجات هذه الحالة (أو None)"""
+        digest, order = self.fingerprint(state)
+        
+        with self.lock:
+            moves = self.memory.get(digest)
+            if moves is not None:
+                self.memory.move_to_end(digest)
+                source = 'memory_hits'
+            else:
+                moves = self._load(digest)
+                source = 'disk_hits'
+        
+        if moves is None:
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+        
+        real_moves = [(order[from_idx], order[to_idx]) for from_idx, to_idx in moves]
+        if not self._replays(state, real_moves):
+            with self.lock:
+                self.stats['rejected'] += 1
+                self.stats['misses'] += 1
+                self.memory.pop(digest, None)
+            self._delete(digest)
+            return None
+        
+        with self.lock:
+            self.stats[source] += 1
+            self._remember(digest, moves)
+        return real_moves
+    
+    def put(self, state, moves):
+        """حفظ حل (بأرقام الزجاجات الحقيقية) لهذه الحالة"""
+        digest, order = self.fingerprint(state)
+        position = {real_idx: canonical_idx for canonical_idx, real_idx in enumerate(order)}
+        canonical_moves = [(position[from_idx], position[to_idx]) for from_idx, to_idx in moves]
+        
+        with self.lock:
+            self._remember(digest, canonical_moves)
+            self.stats['stores'] += 1
+        self._save(digest, canonical_moves)
+    
+    def get_stats(self):
+        """إحصائيات الذاكرة المؤقتة للعرض على المالك"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.memory)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = (hits / lookups * 100) if lookups else 0
+        return stats
+    
+    def _replays(self, state, moves):
+        """التحقق أن الحركات صالحة وتنتهي بلغز مفروز"""
+        current = state.copy()
+        for from_idx, to_idx in moves:
+            if not current.pour(from_idx, to_idx):
+                return False
+        return current.is_sorted()
+    
+    def _remember(self, digest, moves):
+        """إضافة إلى طبقة الذاكرة مع إخراج الأقدم استخداماً"""
+        self.memory[digest] = moves
+        self.memory.move_to_end(digest)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+    
+    def _path(self, digest):
+        return os.path.join(self.directory, f'{digest}.json')
+    
+    def _load(self, digest):
+        """قراءة حل من القرص"""
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return [tuple(move) for move in json.load(f)['moves']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _save(self, digest, moves):
+        """كتابة حل على القرص (ملف مؤقت ثم استبدال)"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self._path(digest) + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'moves': moves}, f)
+            os.replace(temp_path, self._path(digest))
+        except OSError as e:
+            print(f"Error saving solution {digest}: {e}")
+    
+    def _delete(self, digest):
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
+
+
+class LayoutCache:
+    """مواقع الزجاجات لأشكال شاشات سبق تحليلها، حتى لا يُعاد كشفها لكل صورة
+    
+    المفتاح: أبعاد الصورة وبصمة الشكل (انظر ImageProcessor._layout_signature)
+    كعدد بتات. صورتان بنفس الأبعاد تُعتبران نفس الشكل إذا اختلفت بصمتاهما في
+    نسبة بتات لا تتجاوز tolerance، لأن تغير ألوان السوائل يغير بعض البتات.
+    """
+    
+    def __init__(self, max_entries=LAYOUT_CACHE_SIZE, tolerance=LAYOUT_SIGNATURE_TOLERANCE):
+        self.max_entries = max_entries
+        self.tolerance = tolerance
+        self.layouts = OrderedDict()  # (الارتفاع، العرض، البصمة، عدد البتات) -> مواقع الزجاجات
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'rejected': 0, 'stores': 0}
+    
+    def get(self, signature):
+        """مواقع الزجاجات لأقرب شكل محفوظ بنفس الأبعاد (أو None)"""
+        height, width, bits, size = signature
+        limit = size * self.tolerance
+        with self.lock:
+            best, best_distance = None, None
+            for key in self.layouts:
+                if key[:2] != (height, width) or key[3] != size:
+                    continue
+                distance = bin(key[2] ^ bits).count('1')
+                if distance <= limit and (best is None or distance < best_distance):
+                    best, best_distance = key, distance
+            if best is None:
+                self.stats['misses'] += 1
+                return None
+            self.layouts.move_to_end(best)
+            self.stats['hits'] += 1
+            return list(self.layouts[best])
+    
+    def put(self, signature, bottles):
+        """حفظ مواقع زجاجات صورة أعطت لغزاً صالحاً"""
+        with self.lock:
+            self.layouts[signature] = [tuple(rect) for rect in bottles]
+            self.layouts.move_to_end(signature)
+            self.stats['stores'] += 1
+            while len(self.layouts) > self.max_entries:
+                self.layouts.popitem(last=False)
+    
+    def reject(self, signature):
+        """حذف الشكل الأقرب لهذه البصمة بعد أن أعطت مواقعه لغزاً غير صالح"""
+        height, width, bits, size = signature
+        with self.lock:
+            candidates = [key for key in self.layouts if key[:2] == (height, width) and key[3] == size]
+            if candidates:
+                closest = min(candidates, key=lambda key: bin(key[2] ^ bits).count('1'))
+                del self.layouts[closest]
+            self.stats['rejected'] += 1
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.layouts)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] / lookups * 100) if lookups else 0
+        return stats
+
+
+# ذاكرة مؤقتة مشتركة لكل العملية
+solution_cache = SolutionCache()
+layout_cache = LayoutCache()
@@ -0,0 +1,234 @@
+from .puzzle import PuzzleState
+
+
+class StateEncoder:
+    """ترميز حالة اللغز كعدد صحيح واحد مضغوط بالبتات
+    
+    كل لون يأخذ رقماً من 1 إلى عدد الألوان (0 محجوز للفراغ)، وكل طبقة
+    تأخذ `bits` بت، وكل زجاجة تأخذ `capacity * bits` بت. الطبقات مخزنة
+    من الأسفل للأعلى لذلك ارتفاع الزجاجة يُحسب من bit_length مباشرة.
+    """
+    
+    def __init__(self, initial_state):
+        self.capacity = initial_state.capacity
+        self.num_bottles = initial_state.num_bottles
+        
+        # ترقيم الألوان حسب ترتيب ظهورها
+        self.colors = [None]
+        self.color_ids = {}
+        for bottle in initial_state.bottles:
+            for color in bottle:
+                if color and color != 'EMPTY' and color not in self.color_ids:
+                    self.color_ids[color] = len(self.colors)
+                    self.colors.append(color)
+        
+        self.bits = max(1, (len(self.colors) - 1).bit_length())
+        self.layer_mask = (1 << self.bits) - 1
+        self.width = self.bits * self.capacity
+        self.bottle_mask = (1 << self.width) - 1
+        
+        # repeat[n] * color = n طبقات متتالية من نفس اللون
+        self.repeat = [0]
+        for n in range(1, self.capacity + 1):
+            self.repeat.append(self.repeat[-1] | (1 << (self.bits * (n - 1))))
+        
+        self._boundary_cache = {}
+        self._run_cache = {}
+    
+    def encode(self, state):
+        """تحويل PuzzleState إلى مفتاح صحيح"""
+        key = 0
+        for i, bottle in enumerate(state.bottles):
+            value = 0
+            layer = 0
+            # من الأسفل للأعلى
+            for color in reversed(bottle):
+                if color and color != 'EMPTY':
+                    if color not in self.color_ids:
+                        raise ValueError(f"لون غير معروف: {color}")
+                    value |= self.color_ids[color] << (self.bits * layer)
+                    layer += 1
+            key |= value << (self.width * i)
+        return key
+    
+    def decode(self, key):
+        """تحويل المفتاح إلى PuzzleState"""
+        bottles = []
+        for value in self.split(key):
+            colors = []
+            while value:
+                colors.append(self.colors[value & self.layer_mask])
+                value >>= self.bits
+            colors.reverse()
+            bottles.append(['EMPTY'] * (self.capacity - len(colors)) + colors)
+        return PuzzleState(bottles, self.capacity)
+    
+    def split(self, key):
+        """قائمة بقيم الزجاجات المنفصلة"""
+        return [(key >> (self.width * i)) & self.bottle_mask for i in range(self.num_bottles)]
+    
+    def join(self, bottles):
+        """دمج قيم الزجاجات في مفتاح واحد"""
+        key = 0
+        for i, value in enumerate(bottles):
+            key |= value << (self.width * i)
+        return key
+    
+    def bottle(self, key, idx):
+        """قيمة زجاجة واحدة من المفتاح"""
+        return (key >> (self.width * idx)) & self.bottle_mask
+    
+    def height(self, value):
+        """عدد الطبقات الممتلئة في الزجاجة"""
+        return (value.bit_length() + self.bits - 1) // self.bits
+    
+    def top_color(self, value):
+        """رقم اللون العلوي (0 للزجاجة الفارغة)"""
+        if not value:
+            return 0
+        return value >> (self.bits * (self.height(value) - 1))
+    
+    def top_run(self, value):
+        """عدد طبقات اللون العلوي المتتالية (محفوظ لكل قيمة زجاجة)"""
+        run = self._run_cache.get(value)
+        if run is None:
+            height = self.height(value)
+            top = value >> (self.bits * (height - 1)) if height else 0
+            run = 1 if height else 0
+            while run < height and (value >> (self.bits * (height - 1 - run))) & self.layer_mask == top:
+                run += 1
+            self._run_cache[value] = run
+        return run
+    
+    def is_uniform(self, value):
+        """التحقق إذا كانت الزجاجة من لون واحد (أو فارغة)"""
+        return value == (value & self.layer_mask) * self.repeat[self.height(value)]
+    
+    def is_sorted(self, key):
+        """التحقق إذا كانت جميع الزجاجات مفروزة"""
+        return all(self.is_uniform(value) for value in self.split(key))
+    
+    def can_pour(self, key, from_idx, to_idx):
+        """التحقق إذا كان الصب ممكناً"""
+        if from_idx == to_idx:
+            return False
+        source = self.bottle(key, from_idx)
+        if not source:
+            return False
+        target = self.bottle(key, to_idx)
+        if self.height(target) >= self.capacity:
+            return False
+        return not target or self.top_color(target) == self.top_color(source)
+    
+    def pour(self, key, from_idx, to_idx):
+        """تنفيذ الصب وإرجاع المفتاح الجديد (أو None إذا لم يكن ممكناً)"""
+        if not self.can_pour(key, from_idx, to_idx):
+            return None
+        source = self.bottle(key, from_idx)
+        target = self.bottle(key, to_idx)
+        return self._pour_values(key, from_idx, to_idx, source, target,
+                                 self.height(source), self.top_run(source),
+                                 self.height(target))
+    
+    def _pour_values(self, key, from_idx, to_idx, source, target,
+                     source_height, source_run, target_height):
+        """الصب باستخدام ملخصات الزجاجتين المحسوبة مسبقاً"""
+        amount = min(source_run, self.capacity - target_height)
+        color = source >> (self.bits * (source_height - 1))
+        new_source = source & ((1 << (self.bits * (source_height - amount))) - 1)
+        new_target = target | ((color * self.repeat[amount]) << (self.bits * target_height))
+        return (key
+                + ((new_source - source) << (self.width * from_idx))
+                + ((new_target - target) << (self.width * to_idx)))
+    
+    def successors(self, key):
+        """توليد جميع الحركات الممكنة: (from_idx, to_idx, المفتاح الجديد)"""
+        bottles = self.split(key)
+        heights = [self.height(value) for value in bottles]
+        tops = [value >> (self.bits * (h - 1)) if h else 0 for value, h in zip(bottles, heights)]
+        
+        for from_idx, source in enumerate(bottles):
+            if not source:
+                continue
+            source_height = heights[from_idx]
+            source_top = tops[from_idx]
+            source_run = self.top_run(source)
+            for to_idx, target in enumerate(bottles):
+                if to_idx == from_idx:
+                    continue
+                target_height = heights[to_idx]
+                if target_height >= self.capacity:
+                    continue
+                if target and tops[to_idx] != source_top:
+                    continue
+                yield from_idx, to_idx, self._pour_values(
+                    key, from_idx, to_idx, source, target,
+                    source_height, source_run, target_height
+                )
+    
+    def is_deadlocked(self, bottles):
+        """التحقق أن الحالة (قائمة قيم الزجاجات) لا يمكن حلها أبداً
+        
+        بدون زجاجة فارغة يُصب لون فقط بين زجاجات لها نفس اللون العلوي، فلا
+        يتغير شيء تحته إلا إذا أُفرغ لون إحداها بالكامل في الباقيات. إذا لم
+        يكن ذلك ممكناً لأي لون (حتى بعد إعادة التوزيع) والحالة غير مفروزة
+        فهي عالقة نهائياً.
+        """
+        if 0 in bottles:
+            return False
+        
+        groups = {}  # اللون العلوي -> [مجموع طبقاته العلوية، مجموع المساحة له، أصغر مساحة]
+        stuck_layers = False
+        for value in bottles:
+            height = self.height(value)
+            run = self.top_run(value)
+            room = self.capacity - (height - run)  # ما تتسعه الزجاجة من اللون العلوي
+            stuck_layers = stuck_layers or run < height
+            group = groups.get(value >> (self.bits * (height - 1)))
+            if group is None:
+                groups[value >> (self.bits * (height - 1))] = [run, room, room]
+            else:
+                group[0] += run
+                group[1] += room
+                group[2] = min(group[2], room)
+        
+        if not stuck_layers:
+            return False  # مفروزة
+        # يمكن تفريغ زجاجة إذا اتسعت الباقيات لكل طبقات لونها العلوي
+        return all(total_room - min_room < units for units, total_room, min_room in groups.values())
+    
+    def bottle_boundaries(self, value):
+        """عدد الحدود بين الألوان المختلفة داخل زجاجة واحدة"""
+        boundaries = self._boundary_cache.get(value)
+        if boundaries is None:
+            boundaries = 0
+            below = value & self.layer_mask
+            rest = value >> self.bits
+            while rest:
+                layer = rest & self.layer_mask
+                if layer != below:
+                    boundaries += 1
+                below = layer
+                rest >>= self.bits
+            self._boundary_cache[value] = boundaries
+        return boundaries
+    
+    def lower_bound(self, key):
+        """حد أدنى مقبول لعدد الحركات المتبقية
+        
+        كل صبة تزيل حداً واحداً على الأكثر من الزجاجة المصدر ولا تضيف حدوداً
+        للهدف، والحالة المفروزة بلا حدود، لذلك مجموع الحدود لا يبالغ أبداً.
+        """
+        return sum(self.bottle_boundaries(value) for value in self.split(key))
+    
+    def canonical(self, key):
+        """الشكل القياسي للحالة: الزجاجات مرتبة حسب قيمتها
+        
+        حالتان تختلفان فقط في مكان كل زجاجة لهما نفس الشكل القياسي.
+        """
+        return self.join(sorted(self.split(key)))
+    
+    def canonical_order(self, key):
+        """أرقام الزجاجات الحقيقية بترتيب الشكل القياسي"""
+        bottles = self.split(key)
+        return sorted(range(self.num_bottles), key=bottles.__getitem__)
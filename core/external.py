@@ -0,0 +1,154 @@
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+
+class ExternalBFS:
+    """BFS طبقة بطبقة على القرص للبحث الذي لا تكفيه الذاكرة
+    
+    كل طبقة ملف سجلات ثابتة الطول مرتبة حسب المفتاح: (مفتاح الحالة القياسي
+    بترتيب big-endian حتى يطابق ترتيب البايتات ترتيب الأعداد، رقم الأب في
+    الطبقة السابقة، الحركة مضغوطة). الأبناء يُجمعون في دفعات تُرتب وتُكتب
+    كملفات مؤقتة، ثم تُدمج مع حذف المكرر ومقارنتها بكل الطبقات السابقة
+    (مقروءة بـ mmap) بالمرور المتوازي على ملفات مرتبة. الذاكرة المستخدمة
+    حجم الدفعة فقط مهما كبر البحث.
+    
+    قاعدتا undo و commute لا تُطبقان لأنهما تحتاجان أوصاف الصبات السابقة.
+    """
+    
+    def __init__(self, encoder, pruner, normalize, tick=None, directory=None, chunk_size=200_000):
+        self.encoder = encoder
+        self.pruner = pruner
+        self.normalize = normalize
+        self.tick = tick  # tick(حجم الطبقة، العمق) لمراقبة الميزانية
+        self.directory = directory  # None = مجلد النظام المؤقت
+        self.chunk_size = chunk_size
+        self.key_size = (encoder.width * encoder.num_bottles + 7) // 8
+        self.record = struct.Struct(f'>{self.key_size}sIH')
+        self.stored = 0  # عدد الحالات المكتوبة في كل الطبقات
+        self.duplicates = 0  # أبناء حُذفوا لأنهم مكررون أو مزارون سابقاً
+    
+    def __len__(self):
+        return self.stored
+    
+    def solve(self, start_key):
+        """إرجاع الحركات بأرقام الشكل القياسي لكل حالة، أو None"""
+        with tempfile.TemporaryDirectory(prefix='colorsort_bfs_', dir=self.directory) as scratch:
+            self.scratch = scratch
+            layers = [self._layer_path(0)]
+            with open(layers[0], 'wb') as f:
+                f.write(self.record.pack(self._pack_key(self.normalize(start_key)), 0, 0))
+            self.stored = 1
+            
+            depth = 0
+            while True:
+                runs, goal = self._expand(layers[depth], depth)
+                if goal is not None:
+                    return self._reconstruct_path(layers, depth, goal)
+                
+                layers.append(self._layer_path(depth + 1))
+                count = self._merge(runs, layers, layers[-1])
+                for run in runs:
+                    os.remove(run)
+                if not count:
+                    return None  # لا يوجد حل
+                depth += 1
+    
+    def _layer_path(self, depth):
+        return os.path.join(self.scratch, f'layer_{depth}.bin')
+    
+    def _pack_key(self, key):
+        return key.to_bytes(self.key_size, 'big')
+    
+    def _records(self, path):
+        """المرور على سجلات ملف مرتب عبر mmap"""
+        size = os.path.getsize(path)
+        if not size:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from self.record.iter_unpack(data)
+    
+    def _expand(self, layer_path, depth):
+        """توليد أبناء الطبقة في ملفات مرتبة، يعيد (الملفات، رقم الحالة المفروزة أو None)"""
+        encoder = self.encoder
+        layer_size = os.path.getsize(layer_path) // self.record.size
+        runs = []
+        chunk = []
+        for index, (packed_key, _, _) in enumerate(self._records(layer_path)):
+            if self.tick:
+                self.tick(layer_size, depth)
+            key = int.from_bytes(packed_key, 'big')
+            if encoder.is_sorted(key):
+                return runs, index
+            
+            for from_idx, to_idx, new_key, _ in self.pruner.successors(key):
+                chunk.append((self._pack_key(self.normalize(new_key)), index, (from_idx << 8) | to_idx))
+            if len(chunk) >= self.chunk_size:
+                runs.append(self._write_run(chunk, depth, len(runs)))
+                chunk = []
+        
+        if chunk:
+            runs.append(self._write_run(chunk, depth, len(runs)))
+        return runs, None
+    
+    def _write_run(self, chunk, depth, number):
+        """ترتيب دفعة أبناء وكتابتها (بدون المكرر داخلها)"""
+        chunk.sort()
+        path = os.path.join(self.scratch, f'run_{depth}_{number}.bin')
+        with open(path, 'wb') as f:
+            previous = None
+            for packed_key, parent, move in chunk:
+                if packed_key != previous:
+                    f.write(self.record.pack(packed_key, parent, move))
+                    previous = packed_key
+                else:
+                    self.duplicates += 1
+        return path
+    
+    def _merge(self, runs, layers, output):
+        """دمج الدفعات المرتبة في الطبقة الجديدة بدون الحالات المكررة أو المزارة سابقاً"""
+        merged = heapq.merge(*(self._records(run) for run in runs))
+        
+        # مؤشر متقدم على كل طبقة سابقة (كلها مرتبة مثل الدمج)
+        visited = [self._records(path) for path in layers[:-1]]
+        heads = [next(records, None) for records in visited]
+        
+        count = 0
+        previous = None
+        with open(output, 'wb') as f:
+            for packed_key, parent, move in merged:
+                if packed_key == previous:
+                    self.duplicates += 1
+                    continue
+                previous = packed_key
+                
+                seen = False
+                for i, records in enumerate(visited):
+                    while heads[i] is not None and heads[i][0] < packed_key:
+                        heads[i] = next(records, None)
+                    if heads[i] is not None and heads[i][0] == packed_key:
+                        seen = True
+                if seen:
+                    self.duplicates += 1
+                else:
+                    f.write(self.record.pack(packed_key, parent, move))
+                    count += 1
+        
+        for records in visited:
+            records.close()
+        self.stored += count
+        return count
+    
+    def _reconstruct_path(self, layers, depth, index):
+        """السير على أرقام الآباء من الطبقة الأخيرة مع قراءة سجل واحد من كل طبقة"""
+        path = []
+        while depth > 0:
+            with open(layers[depth], 'rb') as f:
+                f.seek(index * self.record.size)
+                _, index, move = self.record.unpack(f.read(self.record.size))
+            path.append((move >> 8, move & 0xFF))
+            depth -= 1
+        path.reverse()
+        return path
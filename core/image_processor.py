@@ -1,36 +1,149 @@
+import hashlib
+import io
+import os
 import cv2
 import numpy as np
 from PIL import Image
-import colorsys
-from config import COLOR_CLUSTERS, COLOR_PALETTE
+from colors import COLOR_SYSTEM, get_color_emoji
+from config import COLOR_LUT_FILE, COLOR_LUT_BITS, IMAGE_MAX_SIZE
 
 class ImageProcessor:
     """معالجة الصور لاستخراج حالة اللغز"""
     
-    def __init__(self):
+    # أبعد مسافة (ΔE في CIELAB) عن أقرب لون في اللوحة، والبكسل الأبعد منها لا يُحسب لأي لون
+    MAX_COLOR_DISTANCE = 40
+    
+    # (أسماء الألوان، مصفوفة CIELAB) تُحسب مرة واحدة من colors.COLOR_SYSTEM
+    _palette = None
+    
+    # التصغير أثناء فك الصورة: JPEG يُفك مباشرة بـ 1/2 أو 1/4 أو 1/8 من أبعاده
+    # (في مجال DCT) بدلاً من فكها كاملة ثم تصغيرها
+    REDUCED_MODES = (
+        (8, cv2.IMREAD_REDUCED_COLOR_8),
+        (4, cv2.IMREAD_REDUCED_COLOR_4),
+        (2, cv2.IMREAD_REDUCED_COLOR_2)
+    )
+    
+    # جدول بحث ثلاثي الأبعاد: كل قناة BGR مكممة إلى 2**COLOR_LUT_BITS مستوى،
+    # والقيمة رقم أقرب لون في اللوحة أو len(names) للبكسل البعيد عن كل الألوان
+    _lut = None
+    
+    # دقة بصمة شكل الشاشة: عرض الصورة المصغرة المستخدمة لحسابها
+    SIGNATURE_WIDTH = 64
+    
+    def __init__(self, layout_cache=None):
+        self.layout_cache = layout_cache  # LayoutCache اختياري لمواقع الزجاجات
+        self.layout_cached = False  # هل استُخدمت مواقع محفوظة في آخر صورة
         self.colors_detected = []
+        # لكل زجاجة وطبقة: الفرق بين نسبتي أكثر لونين بين بكسلاتها (0-1، أصغر = أقل ثقة)
+        self.confidence = []
     
-    def process_image(self, image_path):
-        """معالجة الصورة لاستخراج الزجاجات والألوان"""
-        # تحميل الصورة
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError("تعذر تحميل الصورة")
+    def process_image(self, image):
+        """معالجة الصورة لاستخراج الزجاجات والألوان
+        
+        image: مسار ملف، أو محتوى الصورة المضغوط في الذاكرة (bytes أو bytearray
+        أو memoryview كما تُحمّل من تلجرام)، أو مصفوفة BGR مفكوكة مسبقاً.
+        """
+        img = self._load_image(image)
+        self.layout_cached = False
         
-        # تحويل إلى HSV لتحليل الألوان بشكل أفضل
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        # نفس شكل شاشة سابقة: استخدام مواقع زجاجاتها إذا أعطت لغزاً صالحاً
+        signature = None
+        if self.layout_cache is not None:
+            signature = self._layout_signature(img)
+            bottles = self.layout_cache.get(signature)
+            if bottles is not None:
+                puzzle_state = self._extract_bottle_colors(img, bottles)
+                if self._is_valid_layout(puzzle_state):
+                    self.layout_cached = True
+                    return puzzle_state
+                self.layout_cache.reject(signature)
         
         # كشف الزجاجات (التقريب المبسط)
         bottles = self._detect_bottles(img)
         
-        # استخراج ألوان كل زجاجة
-        puzzle_state = []
-        for bottle_rect in bottles:
-            bottle_colors = self._extract_bottle_colors(img, hsv, bottle_rect)
-            puzzle_state.append(bottle_colors)
-        
+        # استخراج ألوان كل الزجاجات دفعة واحدة
+        puzzle_state = self._extract_bottle_colors(img, bottles)
+        if signature is not None and self._is_valid_layout(puzzle_state):
+            self.layout_cache.put(signature, bottles)
         return puzzle_state
     
+    def _layout_signature(self, img):
+        """بصمة رخيصة لشكل الشاشة: (الارتفاع، العرض، البتات، عددها)
+        
+        من الحواف العمودية فقط (جدران الزجاجات) في صورة رمادية مصغرة، لأن
+        حدود طبقات السوائل أفقية فلا يغيرها اختلاف الألوان بين مرحلة وأخرى.
+        بت لكل عمود ولكل صف: هل مجموع الحواف فيه أكبر من المتوسط.
+        """
+        height, width = img.shape[:2]
+        small_height = max(1, round(height * self.SIGNATURE_WIDTH / width))
+        # أخذ بكسل من كل step قبل INTER_AREA (بطيء مع نسب تصغير كبيرة غير صحيحة)
+        step = max(1, width // (self.SIGNATURE_WIDTH * 4))
+        gray = cv2.cvtColor(np.ascontiguousarray(img[::step, ::step]), cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, (self.SIGNATURE_WIDTH, small_height), interpolation=cv2.INTER_AREA)
+        edges = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0))
+        columns, rows = edges.sum(axis=0), edges.sum(axis=1)
+        profile = np.concatenate([columns > columns.mean(), rows > rows.mean()])
+        bits = 0
+        for bit in profile:
+            bits = (bits << 1) | int(bit)
+        return (height, width, bits, len(profile))
+    
+    def _is_valid_layout(self, puzzle_state):
+        """هل تبدو الألوان المقروءة لغزاً صالحاً (لقبول مواقع الزجاجات)
+        
+        مواقع خاطئة تقرأ غالباً خلفية فقط (كل الطبقات فارغة) أو ألواناً بأعداد
+        عشوائية، لذلك يُشترط لونان على الأقل كل منها 4 مرات ولغز غير عالق.
+        """
+        from config import MIN_BOTTLES, MAX_BOTTLES
+        from utils.validators import validate_puzzle_state, check_solvable
+        
+        if not MIN_BOTTLES <= len(puzzle_state) <= MAX_BOTTLES:
+            return False
+        colors = {color for bottle in puzzle_state for color in bottle if color != 'EMPTY'}
+        if len(colors) < 2:
+            return False
+        return validate_puzzle_state(puzzle_state)[0] and check_solvable(puzzle_state)[0]
+    
+    def _load_image(self, image, max_size=IMAGE_MAX_SIZE):
+        """فك الصورة مرة واحدة في الذاكرة وتصغيرها إذا تجاوز أحد بعديها max_size"""
+        if isinstance(image, np.ndarray):
+            img = image
+        elif isinstance(image, (bytes, bytearray, memoryview)):
+            flags = self._decode_flags(io.BytesIO(image), max_size)
+            # np.frombuffer لا ينسخ المحتوى
+            img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
+        else:
+            path = os.fspath(image)
+            img = cv2.imread(path, self._decode_flags(path, max_size))
+        if img is None or img.ndim != 3:
+            raise ValueError("تعذر تحميل الصورة")
+        
+        height, width = img.shape[:2]
+        scale = max_size / max(height, width)
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            # بعد الفك المصغر يبقى تصغير أقل من النصف، و INTER_LINEAR يكفيه وأسرع بكثير
+            interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+            img = cv2.resize(img, size, interpolation=interpolation)
+        return img
+    
+    def _decode_flags(self, source, max_size):
+        """أكبر تصغير أثناء الفك يبقي أكبر بعد للصورة max_size على الأقل
+        
+        الأبعاد تُقرأ من رأس الملف فقط (PIL لا يفك الصورة عند الفتح)، والباقي
+        حتى max_size يصغره _load_image بعد الفك.
+        """
+        try:
+            with Image.open(source) as header:
+                longest = max(header.size)
+        except (OSError, ValueError):
+            return cv2.IMREAD_COLOR
+        for factor, flags in self.REDUCED_MODES:
+            if longest // factor >= max_size:
+                return flags
+        return cv2.IMREAD_COLOR
+    
     def _detect_bottles(self, image):
         """كشف مواقع الزجاجات في الصورة"""
         # هذه نسخة مبسطة - في الإصدار الحقيقي تحتاج خوارزمية أكثر تطوراً
@@ -56,78 +169,127 @@ class ImageProcessor:
         
         return bottles[:20]  # الحد الأقصى 20 زجاجة
     
-    def _extract_bottle_colors(self, img, hsv, bottle_rect):
-        """استخراج ألوان زجاجة واحدة"""
-        x, y, w, h = bottle_rect
+    def _extract_bottle_colors(self, img, bottles):
+        """استخراج ألوان كل الزجاجات، وحفظ ثقة كل طبقة في self.confidence
         
-        # تقسيم الزجاجة إلى 4 طبقات
-        layer_height = h // 4
-        bottle_colors = []
+        كل بكسل يُصنف بجدول البحث، ولون الطبقة هو الأكثر بين بكسلاتها بدلاً من
+        تصنيف متوسطها، فلا يغير اللمعان أو التدرج أو الحواف النتيجة. إذا كانت
+        أغلب البكسلات بعيدة عن كل الألوان فالطبقة فارغة.
+        """
+        names, _ = self._get_palette()
+        empty_id = len(names)
+        # الحاويات: ألوان اللوحة ثم البكسلات البعيدة عن كل الألوان
+        color_ids = self.classify_pixels(img)
         
-        for layer in range(4):
-            layer_y = y + (layer * layer_height)
-            layer_roi = img[layer_y:layer_y + layer_height, x:x + w]
-            hsv_roi = hsv[layer_y:layer_y + layer_height, x:x + w]
-            
-            if layer_roi.size == 0:
-                bottle_colors.append('EMPTY')
-                continue
-            
-            # حساب متوسط اللون
-            avg_color = np.mean(layer_roi, axis=(0, 1))
-            avg_hsv = np.mean(hsv_roi, axis=(0, 1))
-            
-            # تحويل إلى لون مسمى
-            color_name = self._classify_color(avg_color, avg_hsv)
-            bottle_colors.append(color_name)
+        labels = []
+        confidence = []
+        for x, y, w, h in bottles:
+            layer_height = h // 4
+            bottle_colors = []
+            bottle_confidence = []
+            for layer in range(4):
+                layer_y = y + (layer * layer_height)
+                layer_ids = color_ids[layer_y:layer_y + layer_height, x:x + w]
+                if not layer_ids.size:
+                    bottle_colors.append('EMPTY')
+                    bottle_confidence.append(0.0)
+                    continue
+                
+                counts = np.bincount(layer_ids.ravel(), minlength=empty_id + 1)
+                top_two = np.partition(counts, -2)[-2:]
+                winner = int(counts.argmax())
+                bottle_colors.append('EMPTY' if winner == empty_id else names[winner])
+                bottle_confidence.append(float(top_two[1] - top_two[0]) / layer_ids.size)
+            labels.append(bottle_colors)
+            confidence.append(bottle_confidence)
         
-        return bottle_colors
+        self.confidence = confidence
+        self.colors_detected = sorted({color for bottle in labels for color in bottle} - {'EMPTY'})
+        return labels
     
-    def _classify_color(self, bgr_color, hsv_color):
-        """تصنيف اللون إلى أقرب لون معروف"""
-        r, g, b = bgr_color[2], bgr_color[1], bgr_color[0]
-        h, s, v = hsv_color
-        
-        # تحويل إلى hex
-        hex_color = f"#{int(r):02x}{int(g):02x}{int(b):02x}".upper()
-        
-        # البحث في تجميعات الألوان
-        best_match = 'UNKNOWN'
-        min_distance = float('inf')
-        
-        for cluster_name, cluster_colors in COLOR_CLUSTERS.items():
-            for cluster_color in cluster_colors:
-                # حساب المسافة بين الألوان
-                distance = self._color_distance(hex_color, cluster_color)
-                if distance < min_distance:
-                    min_distance = distance
-                    best_match = cluster_name
-        
-        # إذا كانت المسافة كبيرة جداً، قد تكون فارغة
-        if min_distance > 100:
-            return 'EMPTY'
-        
-        return best_match
+    def classify_pixels(self, bgr_image):
+        """رقم لون كل بكسل (مصفوفة uint8 بأبعاد الصورة) بفهرسة واحدة في جدول البحث"""
+        lut = self._get_lut()
+        quantized = (np.asarray(bgr_image, dtype=np.uint8) >> (8 - COLOR_LUT_BITS)).astype(np.intp)
+        flat = (quantized[..., 0] << (2 * COLOR_LUT_BITS)) | (quantized[..., 1] << COLOR_LUT_BITS) | quantized[..., 2]
+        return lut.ravel()[flat]
     
-    def _color_distance(self, hex1, hex2):
-        """حساب المسافة بين لونين"""
-        # تحويل hex إلى RGB
-        r1 = int(hex1[1:3], 16)
-        g1 = int(hex1[3:5], 16)
-        b1 = int(hex1[5:7], 16)
-        
-        r2 = int(hex2[1:3], 16)
-        g2 = int(hex2[3:5], 16)
-        b2 = int(hex2[5:7], 16)
-        
-        # حساب المسافة الإقليدية
-        return ((r1 - r2) ** 2 + (g1 - g2) ** 2 + (b1 - b2) ** 2) ** 0.5
+    @classmethod
+    def _get_lut(cls):
+        """جدول البحث من الملف، أو بناؤه وحفظه إذا لم يوجد أو تغيرت اللوحة"""
+        if cls._lut is None:
+            names, palette = cls._get_palette()
+            signature = hashlib.sha1(repr((
+                [COLOR_SYSTEM[name]['hex'] for name in names],
+                cls.MAX_COLOR_DISTANCE,
+                COLOR_LUT_BITS
+            )).encode()).hexdigest()
+            
+            lut = cls._load_lut(signature)
+            if lut is None:
+                lut = cls._build_lut(palette)
+                cls._save_lut(lut, signature)
+            cls._lut = lut
+        return cls._lut
+    
+    @classmethod
+    def _build_lut(cls, palette):
+        levels = 1 << COLOR_LUT_BITS
+        centers = (np.arange(levels, dtype=np.float32) + 0.5) * (256 / levels)
+        grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1)
+        nearest, closest = cls._nearest(cls._to_lab(grid).reshape(-1, 3), palette)
+        nearest[closest[:, 0] > cls.MAX_COLOR_DISTANCE] = len(palette)
+        return nearest.astype(np.uint8).reshape(levels, levels, levels)
+    
+    @staticmethod
+    def _load_lut(signature):
+        if not os.path.exists(COLOR_LUT_FILE):
+            return None
+        try:
+            with np.load(COLOR_LUT_FILE) as data:
+                if str(data['signature']) != signature:
+                    return None
+                return data['lut']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading color lookup table: {e}")
+            return None
+    
+    @staticmethod
+    def _save_lut(lut, signature):
+        try:
+            directory = os.path.dirname(COLOR_LUT_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # كتابة ملف مؤقت ثم استبداله حتى لا تقرأ عملية أخرى ملفاً ناقصاً
+            temp_path = f"{COLOR_LUT_FILE}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.savez(f, lut=lut, signature=signature)
+            os.replace(temp_path, COLOR_LUT_FILE)
+        except OSError as e:
+            print(f"Error saving color lookup table: {e}")
+    
+    @classmethod
+    def _get_palette(cls):
+        if cls._palette is None:
+            names = [name for name in COLOR_SYSTEM if name != 'UNKNOWN']
+            rgb = [[int(COLOR_SYSTEM[name]['hex'][i:i + 2], 16) for i in (1, 3, 5)] for name in names]
+            bgr = np.array(rgb, dtype=np.float32)[:, ::-1]
+            cls._palette = (names, cls._to_lab(bgr))
+        return cls._palette
+    
+    @staticmethod
+    def _to_lab(bgr):
+        """تحويل ألوان BGR (0-255، أي شكل ينتهي بـ 3) إلى CIELAB"""
+        bgr = np.asarray(bgr, dtype=np.float32)
+        pixels = np.ascontiguousarray(bgr.reshape(-1, 1, 3)) / 255
+        return cv2.cvtColor(pixels, cv2.COLOR_BGR2LAB).reshape(bgr.shape)
+    
+    @staticmethod
+    def _nearest(lab, palette):
+        """(رقم أقرب لون في اللوحة، أصغر مسافتين) لكل لون في مصفوفة Lab بأبعاد (N، 3)"""
+        distances = np.linalg.norm(lab[:, None, :] - palette[None, :, :], axis=2)
+        return distances.argmin(axis=1), np.partition(distances, 1, axis=1)[:, :2]
     
     def get_color_emoji(self, color_name):
         """الحصول على إيموجي اللون"""
-        if color_name in COLOR_PALETTE:
-            return COLOR_PALETTE[color_name][0]
-        elif color_name == 'EMPTY':
-            return '⬜'
-        else:
-            return '❓'
+        return get_color_emoji(color_name)
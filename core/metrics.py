@@ -0,0 +1,102 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc على مستوى العملية كلها، والحلول قد تعمل بالتوازي في خيوط مختلفة:
+# يبدأ التتبع مع أول حل يطلبه ويتوقف مع آخرها، ولا تُصفّر الذروة إلا إذا لم
+# يكن حل آخر يتتبع في نفس الوقت
+_tracing_lock = threading.Lock()
+_tracing_count = 0
+_owns_tracing = False
+
+
+class SolveMetrics:
+    """قياس حل واحد: وقت كل مرحلة، وذروة الذاكرة و cProfile عند الطلب
+    
+    tracemalloc و cProfile يبطئان البحث بوضوح، لذلك لا يعملان إلا إذا طُلبا.
+    peak_memory ذروة العملية كلها: إذا تداخلت عدة حلول تتتبع الذاكرة فهي تشملها معاً.
+    """
+    
+    # عدد الدوال في ملخص cProfile
+    PROFILE_LINES = 25
+    
+    def __init__(self, trace_memory=False, profile=False):
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.phases = {}
+        self._profiler = None
+    
+    def start(self):
+        self._started = time.perf_counter()
+        if self.trace_memory:
+            _start_tracing()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+    
+    @contextmanager
+    def phase(self, name):
+        """إضافة وقت الكتلة لمرحلة باسم name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - started
+    
+    def finish(self):
+        """إيقاف القياس وإرجاع الإحصائيات: elapsed و phases و peak_memory و profile"""
+        result = {
+            'elapsed': time.perf_counter() - self._started,
+            'phases': dict(self.phases)
+        }
+        if self._profiler is not None:
+            self._profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(self._profiler, stream=output).sort_stats('cumulative').print_stats(self.PROFILE_LINES)
+            result['profile'] = output.getvalue()
+            self._profiler = None
+        if self.trace_memory:
+            result['peak_memory'] = _stop_tracing()  # بالبايت
+        return result
+
+
+def _start_tracing():
+    """تسجيل حل جديد يتتبع الذاكرة"""
+    global _tracing_count, _owns_tracing
+    with _tracing_lock:
+        if _tracing_count == 0:
+            # إذا كان tracemalloc يعمل مسبقاً من خارج الحل تُصفّر الذروة فقط ولا يُوقف بعدنا
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                _owns_tracing = True
+        _tracing_count += 1
+
+
+def _stop_tracing():
+    """إنهاء تتبع حل وإرجاع ذروة الذاكرة"""
+    global _tracing_count, _owns_tracing
+    with _tracing_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracing_count -= 1
+        if _tracing_count == 0 and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
+        return peak
+
+
+def log_metrics(stats):
+    """مُستقبل إحصائيات يكتب كل حل كسطر JSON في السجل (ملخص cProfile منفصلاً)"""
+    summary = {key: value for key, value in stats.items() if key != 'profile'}
+    logger.info(f"solver_stats {json.dumps(summary, default=str)}")
+    if 'profile' in stats:
+        logger.info(f"solver_profile\n{stats['profile']}")
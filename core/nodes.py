@@ -0,0 +1,40 @@
+from array import array
+
+
+class NodeStore:
+    """شجرة البحث في مصفوفتين مضغوطتين بدلاً من قاموسي parent و move
+    
+    كل حالة تأخذ رقماً متسلسلاً، ولكل رقم: رقم الأب (4 بايت) والحركة مضغوطة
+    في عدد واحد (2 بايت)، بدلاً من تخزين مفتاح الحالة مرتين ومعه tuple للحركة.
+    المسار يُعاد بناؤه بالسير على أرقام الآباء.
+    """
+    
+    ROOT = -1
+    
+    def __init__(self):
+        self.parents = array('i')
+        self.moves = array('H')
+    
+    def __len__(self):
+        return len(self.parents)
+    
+    def add(self, parent_id=ROOT, from_idx=0, to_idx=0):
+        """إضافة حالة وإرجاع رقمها"""
+        self.parents.append(parent_id)
+        self.moves.append((from_idx << 8) | to_idx)
+        return len(self.parents) - 1
+    
+    def update(self, node_id, parent_id, from_idx, to_idx):
+        """ربط حالة موجودة بأب جديد (طريق أقصر إليها)"""
+        self.parents[node_id] = parent_id
+        self.moves[node_id] = (from_idx << 8) | to_idx
+    
+    def path(self, node_id):
+        """الحركات من الجذر حتى الحالة node_id"""
+        path = []
+        while self.parents[node_id] != self.ROOT:
+            packed = self.moves[node_id]
+            path.append((packed >> 8, packed & 0xFF))
+            node_id = self.parents[node_id]
+        path.reverse()
+        return path
@@ -0,0 +1,91 @@
+import multiprocessing
+import queue
+import time
+from .puzzle import PuzzleState
+
+
+def _run_engine(method, bottles, capacity, options, results):
+    """تشغيل محرك واحد داخل عملية منفصلة وإرسال نتيجته"""
+    from .solver import PuzzleSolver
+    try:
+        solver = PuzzleSolver(PuzzleState(bottles, capacity), method=method, **options)
+        solution = solver.solve()
+        results.put((method, solution, solver.optimal, solver.stats.get('nodes', 0)))
+    except Exception:
+        results.put((method, None, False, 0))
+
+
+class PortfolioRunner:
+    """تشغيل عدة محركات حل بالتوازي، كل محرك في عملية منفصلة
+    
+    أول حل أمثل يُعاد فوراً وتُنهى باقي العمليات. إذا لم يصل حل أمثل قبل
+    المهلة يُعاد أقصر حل غير أمثل (كل محرك يعيد حله البديل عند انتهاء ميزانيته).
+    """
+    
+    # وقت إضافي بعد المهلة حتى تنهي المحركات حلولها البديلة
+    GRACE_PERIOD = 5
+    POLL_INTERVAL = 0.5
+    
+    def __init__(self, methods, time_limit=None, node_limit=None, symmetry=True, pruning=True):
+        self.methods = methods
+        self.time_limit = time_limit
+        self.options = {
+            'symmetry': symmetry,
+            'pruning': pruning,
+            'time_limit': time_limit,
+            'node_limit': node_limit
+        }
+    
+    def run(self, state):
+        """إرجاع (الحل، أمثل؟، الإحصائيات)"""
+        results = multiprocessing.Queue()
+        processes = {}
+        for method in self.methods:
+            process = multiprocessing.Process(
+                target=_run_engine,
+                args=(method, state.bottles, state.capacity, self.options, results),
+                daemon=True
+            )
+            process.start()
+            processes[method] = process
+        
+        deadline = time.monotonic() + self.time_limit + self.GRACE_PERIOD if self.time_limit else None
+        finished = {}
+        winner = None
+        try:
+            while len(finished) < len(processes):
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                try:
+                    method, solution, optimal, nodes = results.get(timeout=self.POLL_INTERVAL)
+                except queue.Empty:
+                    # عملية انتهت بدون نتيجة (مثلاً نفدت ذاكرتها) لا يجب أن تعلق الانتظار
+                    if not any(process.is_alive() for process in processes.values()):
+                        break
+                    continue
+                finished[method] = (solution, optimal, nodes)
+                if solution is not None and optimal:
+                    winner = method
+                    break
+        finally:
+            # إلغاء المحركات التي لم تنته
+            for process in processes.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in processes.values():
+                process.join()
+        
+        if winner is None:
+            candidates = [method for method, (solution, _, _) in finished.items() if solution is not None]
+            if candidates:
+                winner = min(candidates, key=lambda method: len(finished[method][0]))
+        
+        stats = {
+            'winner': winner,
+            'finished': list(finished),
+            'nodes': sum(nodes for _, _, nodes in finished.values())
+        }
+        if winner is None:
+            return None, False, stats
+        solution, optimal, _ = finished[winner]
+        return solution, optimal, stats
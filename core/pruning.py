@@ -0,0 +1,189 @@
+class MovePruner:
+    """توليد الحركات مع تقليم الحركات التي لا تغير طول أقصر حل
+    
+    القواعد:
+    - uniform_to_empty: صب زجاجة من لون واحد في زجاجة فارغة ينقل الزجاجة فقط
+    - duplicate_empty: كل الزجاجات الفارغة متكافئة، نصب في أولها فقط
+    - undo: صبة تعيد الحالة السابقة تماماً (ذهاب وإياب)
+    - commute: صبتان على أزواج زجاجات مختلفة تعطيان نفس النتيجة بأي ترتيب،
+      نستكشف الترتيب القياسي فقط (صالحة لـ BFS طبقة بطبقة فقط)
+    - deadlock: صبة تنتج حالة عالقة لا يمكن حلها (StateEncoder.is_deadlocked)
+    
+    deadlock ليست ضمن القواعد الافتراضية: الحالات التي تقلمها قليلة وكلفة
+    فحصها أكبر من البحث الذي توفره، ويكفي فحص الحالة الأولى قبل البحث.
+    """
+    
+    RULES = ('uniform_to_empty', 'duplicate_empty', 'undo', 'commute', 'deadlock')
+    DEFAULT_RULES = ('uniform_to_empty', 'duplicate_empty', 'undo', 'commute')
+    
+    def __init__(self, encoder, rules=DEFAULT_RULES):
+        for rule in rules:
+            if rule not in self.RULES:
+                raise ValueError(f"قاعدة تقليم غير معروفة: {rule}")
+        self.encoder = encoder
+        self.rules = frozenset(rules)
+        self.counts = dict.fromkeys(self.RULES, 0)
+        self.generated = 0  # الحركات التي تجاوزت التقليم
+        self._summaries = {}  # قيمة الزجاجة -> _bottle_summary
+    
+    def successors(self, key, lasts=()):
+        """توليد (from_idx, to_idx, المفتاح الجديد, last) للحركات غير المقلمة"""
+        width = self.encoder.width
+        bottles = self.encoder.split(key)
+        for from_idx, to_idx, new_source, new_target, last in self.moves(bottles, lasts):
+            new_key = (key
+                       + ((new_source - bottles[from_idx]) << (width * from_idx))
+                       + ((new_target - bottles[to_idx]) << (width * to_idx)))
+            yield from_idx, to_idx, new_key, last
+    
+    def moves(self, bottles, lasts=()):
+        """توليد (from_idx, to_idx, قيمة المصدر الجديدة, قيمة الهدف الجديدة, last)
+        
+        تعمل على قائمة قيم الزجاجات مباشرة حتى يستطيع المستدعي تطبيق الصبة
+        في نفس القائمة والتراجع عنها قبل طلب الحركة التالية.
+        
+        lasts هي أوصاف الصبات التي أوصلت لهذه الحالة على نفس العمق، وكل وصف:
+        (قيمة المصدر بعدها، قيمة الهدف بعدها، الكمية، (قيمة المصدر قبلها،
+        قيمة الهدف قبلها)). يُعتمد على القيم وليس الأرقام لأن ترتيب الزجاجات
+        قد يتغير بالشكل القياسي.
+        """
+        encoder = self.encoder
+        bits = encoder.bits
+        capacity = encoder.capacity
+        heights = [encoder.height(value) for value in bottles]
+        tops = [value >> (bits * (h - 1)) if h else 0 for value, h in zip(bottles, heights)]
+        
+        prune_uniform = 'uniform_to_empty' in self.rules
+        prune_duplicate = 'duplicate_empty' in self.rules
+        prune_undo = 'undo' in self.rules and lasts
+        prune_deadlock = 'deadlock' in self.rules
+        # الترتيب القياسي لا يُطبق إلا إذا كانت كل الصبات السابقة لهدف غير فارغ
+        prune_commute = ('commute' in self.rules and lasts
+                         and all(last[3][1] for last in lasts))
+        first_empty = heights.index(0) if 0 in heights else -1
+        empty_count = heights.count(0)
+        summary = None  # ملخص فحص الحالات العالقة، يُحسب مرة لكل حالة عند أول حاجة
+        
+        for from_idx, source in enumerate(bottles):
+            if not source:
+                continue
+            source_height = heights[from_idx]
+            source_top = tops[from_idx]
+            source_run = encoder.top_run(source)
+            uniform = source_run == source_height
+            
+            for to_idx, target in enumerate(bottles):
+                if to_idx == from_idx:
+                    continue
+                target_height = heights[to_idx]
+                if target_height >= capacity:
+                    continue
+                
+                if not target:
+                    if prune_uniform and uniform:
+                        self.counts['uniform_to_empty'] += 1
+                        continue
+                    if prune_duplicate and to_idx != first_empty:
+                        self.counts['duplicate_empty'] += 1
+                        continue
+                elif tops[to_idx] != source_top:
+                    continue
+                
+                amount = min(source_run, capacity - target_height)
+                if prune_undo and any(amount == last[2] and source == last[1] and target == last[0]
+                                      for last in lasts):
+                    self.counts['undo'] += 1
+                    continue
+                
+                move_key = (source, target)
+                if prune_commute and target and all(
+                        move_key < last[3] and source not in last[:2] and target not in last[:2]
+                        for last in lasts):
+                    # نفس الحالة تُولد من الترتيب المعاكس للصبتين
+                    self.counts['commute'] += 1
+                    continue
+                
+                new_source = source & ((1 << (bits * (source_height - amount))) - 1)
+                new_target = target | ((source_top * encoder.repeat[amount]) << (bits * target_height))
+                
+                # الحالة العالقة ممكنة فقط إذا لم تبق زجاجة فارغة
+                if prune_deadlock and new_source and empty_count == (0 if target else 1):
+                    if summary is None:
+                        summary = self._deadlock_summary(bottles)
+                    if self._child_deadlocked(summary, from_idx, to_idx, new_source, new_target):
+                        self.counts['deadlock'] += 1
+                        continue
+                
+                self.generated += 1
+                yield from_idx, to_idx, new_source, new_target, (new_source, new_target, amount, move_key)
+    
+    def _bottle_summary(self, value):
+        """(اللون العلوي، طبقاته المتتالية، ما تتسعه الزجاجة منه، هل تحته لون آخر)"""
+        summary = self._summaries.get(value)
+        if summary is None:
+            encoder = self.encoder
+            height = encoder.height(value)
+            run = encoder.top_run(value)
+            summary = (value >> (encoder.bits * (height - 1)), run,
+                       encoder.capacity - height + run, run < height)
+            self._summaries[value] = summary
+        return summary
+    
+    def _deadlock_summary(self, bottles):
+        """ملخص StateEncoder.is_deadlocked للحالة الأم حتى يُفحص كل ابن بتحديث ما تغير فقط
+        
+        (ملخص كل زجاجة، الزجاجات حسب اللون العلوي، الألوان التي يمكن تفريغ
+        زجاجة منها، عدد الزجاجات التي تحت لونها العلوي لون آخر)
+        """
+        info = [self._bottle_summary(value) if value else None for value in bottles]
+        members = {}
+        groups = {}  # اللون العلوي -> [مجموع طبقاته العلوية، مجموع المساحة له، أصغر مساحة]
+        stuck = 0
+        for index, item in enumerate(info):
+            if item is None:
+                continue
+            color, run, room, below = item
+            stuck += below
+            group = groups.get(color)
+            if group is None:
+                groups[color] = [run, room, room]
+                members[color] = [index]
+            else:
+                group[0] += run
+                group[1] += room
+                group[2] = min(group[2], room)
+                members[color].append(index)
+        open_colors = {color for color, (units, total_room, min_room) in groups.items()
+                       if total_room - min_room >= units}
+        return info, members, open_colors, stuck
+    
+    def _child_deadlocked(self, summary, from_idx, to_idx, new_source, new_target):
+        """is_deadlocked للحالة بعد الصبة (بدون زجاجة فارغة) بإعادة حساب لونين فقط
+        
+        الصبة تغير زجاجتين فقط، فلا يتغير إلا لونها ولون ما ظهر تحتها في المصدر.
+        إذا أمكن تفريغ زجاجة من لون آخر فالحالة ليست عالقة مباشرة.
+        """
+        info, members, open_colors, stuck = summary
+        changed = {from_idx: self._bottle_summary(new_source), to_idx: self._bottle_summary(new_target)}
+        touched = {info[from_idx][0], changed[from_idx][0]}
+        if any(color not in touched for color in open_colors):
+            return False
+        
+        for index, item in changed.items():
+            stuck += item[3] - (info[index][3] if info[index] is not None else 0)
+        if not stuck:
+            return False  # مفروزة
+        
+        for color in touched:
+            items = [info[index] for index in members.get(color, ()) if index not in changed]
+            items += [item for item in changed.values() if item[0] == color]
+            if self._can_empty(items):
+                return False
+        return True
+    
+    @staticmethod
+    def _can_empty(items):
+        """هل تتسع باقي زجاجات اللون لكل طبقاته العلوية من إحداها"""
+        units = sum(item[1] for item in items)
+        rooms = [item[2] for item in items]
+        return sum(rooms) - min(rooms) >= units
@@ -1,10 +1,20 @@
 class PuzzleState:
-    """تمثيل حالة اللغز"""
+    """تمثيل حالة اللغز
     
-    def __init__(self, bottles, capacity=4):
+    كل زجاجة لها ملخص [اللون العلوي، طول اللون العلوي، المساحة الفارغة،
+    من لون واحد] يُحدّث مع كل صبة، لذلك can_pour و get_top_color و
+    is_sorted لا تعيد فحص محتوى الزجاجات.
+    """
+    
+    def __init__(self, bottles, capacity=4, summaries=None):
         self.bottles = bottles  # قائمة من القوائم
         self.capacity = capacity
         self.num_bottles = len(bottles)
+        
+        if summaries is None:
+            summaries = [self._summarize(bottle) for bottle in bottles]
+        self.summaries = summaries
+        self.unsorted_count = sum(1 for summary in summaries if not summary[3])
     
     def __str__(self):
         result = []
@@ -16,14 +26,30 @@ class PuzzleState:
     def copy(self):
         """إنشاء نسخة من الحالة"""
         copied_bottles = [bottle.copy() for bottle in self.bottles]
-        return PuzzleState(copied_bottles, self.capacity)
+        copied_summaries = [summary.copy() for summary in self.summaries]
+        return PuzzleState(copied_bottles, self.capacity, copied_summaries)
+    
+    def _summarize(self, bottle):
+        """حساب ملخص زجاجة: [اللون العلوي، طول اللون العلوي، المساحة الفارغة، من لون واحد]"""
+        top_color = None
+        top_run = 0
+        free_space = 0
+        run_open = True
+        for color in bottle:
+            if not color or color == 'EMPTY':
+                free_space += 1
+            elif top_color is None:
+                top_color = color
+                top_run = 1
+            elif run_open and color == top_color:
+                top_run += 1
+            else:
+                run_open = False
+        return [top_color, top_run, free_space, self._is_bottle_sorted(bottle)]
     
     def is_sorted(self):
         """التحقق إذا كانت جميع الزجاجات مفروزة"""
-        for bottle in self.bottles:
-            if not self._is_bottle_sorted(bottle):
-                return False
-        return True
+        return self.unsorted_count == 0
     
     def _is_bottle_sorted(self, bottle):
         """التحقق إذا كانت زجاجة مفروزة"""
@@ -42,41 +68,21 @@ class PuzzleState:
     
     def get_top_color(self, bottle_idx):
         """الحصول على اللون العلوي في زجاجة"""
-        bottle = self.bottles[bottle_idx]
-        for color in bottle:
-            if color and color != 'EMPTY':
-                return color
-        return None
+        return self.summaries[bottle_idx][0]
     
     def can_pour(self, from_idx, to_idx):
         """التحقق إذا كان الصب ممكناً"""
         if from_idx == to_idx:
             return False
         
-        from_bottle = self.bottles[from_idx]
-        to_bottle = self.bottles[to_idx]
-        
-        # التحقق من الزجاجة المصدر
-        source_color = None
-        source_count = 0
-        for color in from_bottle:
-            if color and color != 'EMPTY':
-                if source_color is None:
-                    source_color = color
-                if color == source_color:
-                    source_count += 1
-                else:
-                    break
-        
+        source_color = self.summaries[from_idx][0]
         if source_color is None:  # زجاجة مصدر فارغة
             return False
         
-        # التحقق من الزجاجة الهدف
-        target_empty_count = sum(1 for color in to_bottle if not color or color == 'EMPTY')
-        if target_empty_count == 0:  # زجاجة هدف ممتلئة
+        target_top_color, _, target_free, _ = self.summaries[to_idx]
+        if target_free == 0:  # زجاجة هدف ممتلئة
             return False
         
-        target_top_color = self.get_top_color(to_idx)
         if target_top_color is None:  # زجاجة هدف فارغة
             return True
         
@@ -90,23 +96,12 @@ class PuzzleState:
         
         from_bottle = self.bottles[from_idx]
         to_bottle = self.bottles[to_idx]
-        color = self.get_top_color(from_idx)
-        
-        # حساب كمية الصب
-        pour_amount = 0
-        for i in range(len(from_bottle)):
-            if from_bottle[i] and from_bottle[i] != 'EMPTY' and from_bottle[i] == color:
-                pour_amount += 1
-            else:
-                break
-        
-        # حساب السعة المتاحة في الهدف
-        available_space = 0
-        for i in range(len(to_bottle)):
-            if not to_bottle[i] or to_bottle[i] == 'EMPTY':
-                available_space += 1
+        source = self.summaries[from_idx]
+        target = self.summaries[to_idx]
+        color = source[0]
         
-        pour_amount = min(pour_amount, available_space)
+        # كمية الصب = اللون العلوي في المصدر بحدود المساحة المتاحة في الهدف
+        pour_amount = min(source[1], target[2])
         
         # تنفيذ الصب
         for _ in range(pour_amount):
@@ -122,6 +117,24 @@ class PuzzleState:
                     to_bottle[i] = color
                     break
         
+        # تحديث ملخص الهدف
+        was_sorted = source[3], target[3]
+        if target[0] is None:
+            target[1] = pour_amount
+            target[3] = True
+        else:
+            target[1] += pour_amount
+        target[0] = color
+        target[2] -= pour_amount
+        
+        # تحديث ملخص المصدر (إعادة الفحص فقط إذا انتهى اللون العلوي)
+        if pour_amount < source[1]:
+            source[1] -= pour_amount
+            source[2] += pour_amount
+        else:
+            self.summaries[from_idx] = source = self._summarize(from_bottle)
+        
+        self.unsorted_count += (was_sorted[0] - source[3]) + (was_sorted[1] - target[3])
         return True
     
     def to_tuple(self):
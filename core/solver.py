@@ -1,85 +1,667 @@
-from collections import deque
+import heapq
+import itertools
+import math
+import time
+from array import array
 from .puzzle import PuzzleState
+from .encoding import StateEncoder
+from .pruning import MovePruner
+from .nodes import NodeStore
+from .steps import SolutionSteps
+from .metrics import SolveMetrics
+
+class SearchBudgetExceeded(Exception):
+    """تجاوز البحث الوقت أو عدد الحالات المسموح"""
+    pass
 
 class PuzzleSolver:
-    """حل اللغز باستخدام خوارزمية BFS"""
+    """حل اللغز باستخدام خوارزمية BFS أو A*"""
+    
+    METHODS = ('bfs', 'astar', 'ida', 'vector', 'external', 'beam', 'portfolio')
+    
+    # ترتيب الحالات في البحث الشعاعي
+    # lower_bound: أقل حد أدنى، keep_empty: نفسه ثم الأكثر زجاجات فارغة
+    BEAM_HEURISTICS = ('lower_bound', 'keep_empty')
+    
+    # المحركات التي تتسابق في وضع portfolio
+    PORTFOLIO_METHODS = ('bfs', 'astar', 'ida')
+    
+    # فحص الوقت واستدعاء التقدم كل هذا العدد من الحالات
+    CHECK_INTERVAL = 256
     
-    def __init__(self, initial_state):
+    # الحل البديل عند انتهاء الميزانية: A* موزون (غير أمثل لكن سريع)
+    FALLBACK_WEIGHT = 5
+    FALLBACK_NODE_LIMIT = 200_000
+    FALLBACK_TIME_LIMIT = 5  # ثانية
+    
+    def __init__(self, initial_state, method='bfs', symmetry=True, pruning=True,
+                 table_size=1_000_000, time_limit=None, node_limit=None,
+                 progress_callback=None, progress_interval=1.0, cache=None,
+                 portfolio=PORTFOLIO_METHODS, beam_width=1000, beam_heuristic='keep_empty',
+                 scratch_dir=None, metrics_sink=None, trace_memory=False, profile=False):
+        if method not in self.METHODS:
+            raise ValueError(f"طريقة حل غير معروفة: {method}")
+        if beam_heuristic not in self.BEAM_HEURISTICS:
+            raise ValueError(f"ترتيب غير معروف للبحث الشعاعي: {beam_heuristic}")
         self.initial_state = initial_state
+        self.method = method
+        self.symmetry = symmetry
+        self.pruning = pruning
+        self.table_size = table_size  # الحد الأقصى لجدول التبديل في IDA*
+        self.time_limit = time_limit  # بالثواني
+        self.node_limit = node_limit  # عدد الحالات الموسعة
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.cache = cache  # SolutionCache اختياري للحلول السابقة
+        self.portfolio = portfolio  # المحركات المستخدمة مع method='portfolio'
+        self.beam_width = beam_width  # عدد الحالات المحتفظ بها في كل عمق مع method='beam'
+        self.beam_heuristic = beam_heuristic
+        self.scratch_dir = scratch_dir  # مجلد ملفات الطبقات مع method='external'
+        self.metrics_sink = metrics_sink  # يُستدعى بـ stats بعد كل حل (مثل metrics.log_metrics)
+        self.trace_memory = trace_memory  # ذروة الذاكرة بـ tracemalloc (أبطأ)
+        self.profile = profile  # ملخص cProfile في stats['profile'] (أبطأ)
         self.solution = None
+        self.optimal = True
+        self.stats = {}
+        self._resume = None  # (الحالة السابقة، حلها) أثناء resolve
     
     def solve(self):
-        """إيجاد أقصر حل باستخدام BFS"""
+        """إيجاد أقصر حل بالطريقة المختارة
+        
+        بعد الحل يحتوي stats على: engine، nodes (الحالات الموسعة)، generated،
+        duplicates (أبناء موجودون مسبقاً)، peak_frontier، peak_visited، elapsed
+        و phases (ثوانٍ لكل مرحلة)، و peak_memory و profile إذا طُلبا.
+        """
+        self._metrics = SolveMetrics(self.trace_memory, self.profile)
+        self._metrics.start()
+        try:
+            self._solve()
+        finally:
+            self.stats.update(self._metrics.finish())
+        
+        if self.metrics_sink is not None:
+            try:
+                self.metrics_sink(self.stats)
+            except Exception as e:
+                print(f"Error reporting solver stats: {e}")
+        return self.solution
+    
+    def _solve(self):
         if self.initial_state.is_sorted():
-            return []
+            self.solution = []
+            self.optimal = True
+            self.stats = {'engine': None, 'nodes': 0, 'optimal': True}
+            return
+        
+        if self.cache is not None:
+            with self._metrics.phase('cache'):
+                cached = self.cache.get(self.initial_state)
+            if cached is not None:
+                self.solution = cached
+                self.optimal = True
+                self.stats = {'engine': 'cache', 'cache_hit': True, 'nodes': 0, 'optimal': True}
+                return
+        
+        if self.method == 'portfolio' and self._resume is None:
+            with self._metrics.phase('search'):
+                self._solve_portfolio()
+        else:
+            self._search()
+        
+        # الحلول غير المثلى لا تُحفظ حتى لا تُعاد بدل الحل الأقصر لاحقاً
+        if self.cache is not None and self.solution is not None and self.optimal:
+            with self._metrics.phase('cache'):
+                self.cache.put(self.initial_state, self.solution)
+    
+    def resolve(self, state):
+        """إعادة الحل من حالة جديدة أثناء تنفيذ الحل الحالي
+        
+        للحالات التي تنحرف فيها اللعبة عن الحل (حركة مختلفة من المستخدم أو
+        كشف طبقة ❓ مخفية). إذا كانت الحالة على مسار الحل السابق يُعاد باقيه
+        مباشرة، وإلا يُبحث بـ A* وكل حالة على المسار السابق معروف طول الحل
+        منها، فأول وصول لإحداها يعطي حداً أعلى يُقلم به البحث ويُوقف بمجرد
+        أن لا يمكن إيجاد أقصر منه.
+        """
+        previous_state, previous = self.initial_state, self.solution
+        self.initial_state = state
+        self.solution = None
+        if not previous:
+            return self.solve()
+        
+        target = state.to_tuple()
+        current = previous_state.copy()
+        for index in range(len(previous) + 1):
+            if current.to_tuple() == target:
+                self.solution = previous[index:]
+                self.stats = {'resumed': True, 'nodes': 0, 'optimal': self.optimal}
+                return self.solution
+            if index < len(previous):
+                current.pour(*previous[index])
+        
+        self._resume = (previous_state, previous)
+        try:
+            return self.solve()
+        finally:
+            self._resume = None
+    
+    def hint(self, time_limit=0.5):
+        """الحركة التالية فقط (from_idx, to_idx) ضمن مهلة قصيرة، أو None
+        
+        تُستدعى بعد كل حركة للمستخدم مع الحالة الجديدة. تستخدم الحل المحفوظ
+        إن وُجد، وإلا A* موزوناً ضمن المهلة، وإذا لم يكتمل تعيد أول صبة في
+        الطريق إلى أفضل حالة وصلها (أقل حد أدنى ثم الأعمق).
+        """
+        if self.initial_state.is_sorted():
+            return None
+        if self.solution:
+            return self.solution[0]
+        if self.cache is not None:
+            cached = self.cache.get(self.initial_state)
+            if cached:
+                return cached[0]
+        
+        encoder, pruner, start_key = self._prepare(layered=False)
+        self._start_budget(time_limit, None)
+        try:
+            path = self._solve_astar(encoder, pruner, start_key, weight=self.FALLBACK_WEIGHT)
+            return path[0] if path else None
+        except SearchBudgetExceeded:
+            self._astar_search = None
+            nodes, best_id = self._astar_progress
+            path = self._translate_moves(encoder, start_key, nodes.path(best_id))
+            if path:
+                return path[0]
+            return next((from_idx, to_idx) for from_idx, to_idx, _, _ in pruner.successors(start_key))
+    
+    def _prepare(self, layered):
+        """تجهيز المرمّز والمقلّم والعدادات، يعيد (encoder, pruner, start_key)"""
+        # الحالات تُخزن كأعداد صحيحة مضغوطة بدلاً من tuples من النصوص
+        encoder = StateEncoder(self.initial_state)
+        start_key = encoder.encode(self.initial_state)
+        
+        # تقليم الحركات عديمة الفائدة أثناء توليدها
+        # قاعدة الترتيب القياسي (commute) آمنة فقط مع BFS طبقة بطبقة
+        if not self.pruning:
+            rules = ()
+        elif layered:
+            rules = MovePruner.DEFAULT_RULES
+        else:
+            rules = tuple(rule for rule in MovePruner.DEFAULT_RULES if rule != 'commute')
+        pruner = MovePruner(encoder, rules)
+        self.stats = {'pruned': pruner.counts}
+        self._pruner = pruner
+        
+        # مع التماثل تُخزن الحالات بشكلها القياسي (الزجاجات مرتبة)
+        if self.symmetry:
+            self._normalize = encoder.canonical
+        else:
+            self._normalize = lambda key: key
+        
+        self._started = time.monotonic()
+        self._total_nodes = 0
+        self._nodes = 0
+        self._next_progress = self._started + self.progress_interval
+        self._duplicates = 0
+        self._peak_frontier = 0
+        self._peak_visited = 0
+        self._visited = None  # مجموعة الحالات المزارة للمحرك الحالي (لأي شيء له len)
+        self._astar_search = None  # بحث A* أوقفته الميزانية، انظر _run_fallback
+        return encoder, pruner, start_key
+    
+    def _search(self):
+        """تشغيل محرك البحث المختار ضمن الميزانية مع الحل البديل"""
+        with self._metrics.phase('prepare'):
+            encoder, pruner, start_key = self._prepare(self.method == 'bfs' and self._resume is None)
+            deadlocked = encoder.is_deadlocked(encoder.split(start_key))
+        engine = 'astar' if self._resume is not None else self.method
+        
+        # لغز عالق من البداية (قراءة صورة خاطئة مثلاً) يُرفض بدون بحث
+        if deadlocked:
+            self.solution = None
+            self.stats.update({'engine': engine, 'deadlocked': True, 'nodes': 0, 'optimal': True})
+            return
+        
+        self._start_budget(self.time_limit, self.node_limit)
+        try:
+            with self._metrics.phase('search'):
+                if self._resume is not None:
+                    self.solution = self._solve_astar(encoder, pruner, start_key,
+                                                      known=self._known_states(encoder))
+                elif self.method == 'astar':
+                    self.solution = self._solve_astar(encoder, pruner, start_key)
+                elif self.method == 'ida':
+                    self.solution = self._solve_ida(encoder, pruner, start_key)
+                elif self.method == 'vector':
+                    self.solution = self._solve_vector(encoder, pruner, start_key)
+                elif self.method == 'external':
+                    self.solution = self._solve_external(encoder, pruner, start_key)
+                elif self.method == 'beam':
+                    self.solution = self._solve_beam(encoder, pruner, start_key)
+                else:
+                    self.solution = self._solve_bfs(encoder, pruner, start_key)
+            self.optimal = True
+        except SearchBudgetExceeded:
+            # أفضل حل غير أمثل بدلاً من لا شيء
+            self.stats['budget_exhausted'] = True
+            self._run_fallback(encoder, pruner, start_key)
+        else:
+            # خروج كل الطرق من الشعاع لا يثبت أن اللغز بلا حل
+            if self.solution is None and engine == 'beam':
+                self.stats['beam_exhausted'] = True
+                self._run_fallback(encoder, pruner, start_key)
+        
+        # المسافة عن الحد الأدنى: صفر يعني أن الحل أقصر حل مؤكداً
+        lower_bound = encoder.lower_bound(start_key)
+        self.stats['lower_bound'] = lower_bound
+        if self.solution is not None:
+            self.stats['gap'] = len(self.solution) - lower_bound
+            if engine == 'beam':
+                self.optimal = self.stats['gap'] == 0
+        
+        self._note_visited()
+        self.stats.update({
+            'engine': engine,
+            'nodes': self._total_nodes + self._nodes,
+            'generated': pruner.generated,
+            'duplicates': self._duplicates,
+            'peak_frontier': self._peak_frontier,
+            'peak_visited': self._peak_visited,
+            'optimal': self.optimal
+        })
+    
+    def _run_fallback(self, encoder, pruner, start_key):
+        """A* موزون بميزانية خاصة عندما لا يعطي المحرك المختار حلاً مؤكداً
+        
+        إذا أوقفت الميزانية A* نفسه يُكمل نفس البحث بالوزن الجديد ولا يضيع ما
+        زاره، وإلا يبدأ من الحالة الأولى. إذا انتهى البحث كله بدون حل فاللغز
+        بلا حل مؤكداً ولا يُعتبر ذلك نفاداً للميزانية.
+        """
+        self.optimal = False
+        self._start_budget(self.FALLBACK_TIME_LIMIT, self.FALLBACK_NODE_LIMIT)
+        with self._metrics.phase('fallback'):
+            try:
+                self.solution = self._solve_astar(encoder, pruner, start_key, weight=self.FALLBACK_WEIGHT,
+                                                  resume=self._astar_search is not None)
+            except SearchBudgetExceeded:
+                self.solution = None
+                return
+            finally:
+                self._astar_search = None
+        
+        if self.solution is None:
+            self.stats.pop('budget_exhausted', None)
+            self.optimal = True
+    
+    def _solve_portfolio(self):
+        """تشغيل عدة محركات بالتوازي في عمليات منفصلة وأخذ أول حل أمثل"""
+        from .portfolio import PortfolioRunner
+        
+        runner = PortfolioRunner(self.portfolio, self.time_limit, self.node_limit,
+                                 self.symmetry, self.pruning)
+        self.solution, self.optimal, self.stats = runner.run(self.initial_state)
+        self.stats['engine'] = 'portfolio'
+        self.stats['optimal'] = self.optimal
+    
+    def _start_budget(self, time_limit, node_limit):
+        """بدء عداد جديد للوقت وعدد الحالات"""
+        self._note_visited()
+        self._total_nodes += self._nodes
+        self._nodes = 0
+        self._node_cap = node_limit
+        self._deadline = time.monotonic() + time_limit if time_limit else None
+        self._next_check = self.CHECK_INTERVAL
+    
+    def _note_visited(self):
+        """تسجيل حجم الحالات المزارة للمحرك الحالي في peak_visited"""
+        if self._visited is not None:
+            self._peak_visited = max(self._peak_visited, len(self._visited))
+    
+    def _tick(self, frontier_size, depth, count=1):
+        """تسجيل توسيع حالات والتحقق من الميزانية وإرسال التقدم"""
+        self._nodes += count
+        if frontier_size > self._peak_frontier:
+            self._peak_frontier = frontier_size
+        if self._node_cap is not None and self._nodes > self._node_cap:
+            raise SearchBudgetExceeded()
+        if self._nodes < self._next_check:
+            return
+        self._next_check = self._nodes + self.CHECK_INTERVAL
         
-        # BFS
-        queue = deque()
+        now = time.monotonic()
+        if self._deadline is not None and now > self._deadline:
+            raise SearchBudgetExceeded()
+        if self.progress_callback and now >= self._next_progress:
+            self._next_progress = now + self.progress_interval
+            self.progress_callback({
+                'nodes': self._total_nodes + self._nodes,
+                'frontier': frontier_size,
+                'depth': depth,
+                'elapsed': now - self._started
+            })
+    
+    def _solve_bfs(self, encoder, pruner, start_key):
+        """بحث بالعرض: كل الحالات على عمق معين قبل الانتقال للعمق التالي"""
+        nodes = NodeStore()
         visited = set()
-        parent = {}
-        move = {}
         
-        start_tuple = self.initial_state.to_tuple()
-        queue.append(self.initial_state)
-        visited.add(start_tuple)
+        # الطبقة الحالية: الحالة -> (رقمها في nodes، أوصاف الصبات التي أوصلت
+        # إليها على نفس العمق، تحتاجها قاعدة الترتيب القياسي للصبات المستقلة)
+        layer = {self._normalize(start_key): (nodes.add(), [])}
+        visited.update(layer)
+        self._visited = visited
+        depth = 0
         
-        while queue:
-            current_state = queue.popleft()
-            current_tuple = current_state.to_tuple()
+        while layer:
+            next_layer = {}
             
-            # إذا وصلنا للحل
-            if current_state.is_sorted():
-                # إعادة بناء المسار
-                self.solution = self._reconstruct_path(parent, move, current_tuple)
-                return self.solution
+            for current_key, (current_id, lasts) in layer.items():
+                self._tick(len(layer) + len(next_layer), depth)
+                
+                # إذا وصلنا للحل
+                if encoder.is_sorted(current_key):
+                    # إعادة بناء المسار
+                    return self._translate_moves(encoder, start_key, nodes.path(current_id))
+                
+                # توليد الحالات التالية
+                for from_idx, to_idx, new_key, new_last in pruner.successors(current_key, lasts):
+                    new_key = self._normalize(new_key)
+                    if new_key in next_layer:
+                        next_layer[new_key][1].append(new_last)
+                        self._duplicates += 1
+                    elif new_key not in visited:
+                        visited.add(new_key)
+                        next_layer[new_key] = (nodes.add(current_id, from_idx, to_idx), [new_last])
+                    else:
+                        self._duplicates += 1
+            
+            layer = next_layer
+            depth += 1
+        
+        return None  # لا يوجد حل
+    
+    def _solve_astar(self, encoder, pruner, start_key, weight=1, known=None, resume=False):
+        """بحث A* مع حد أدنى مقبول، يعطي نفس طول حل BFS
+        
+        مع weight > 1 يصبح A* موزوناً: أسرع بكثير لكن الحل قد لا يكون الأقصر.
+        known: الحالات (بشكلها القياسي) التي يُعرف منها حل كامل -> (مفتاحها
+        الحقيقي، حركات الحل منها)، انظر resolve.
+        resume: إكمال البحث الذي أوقفته الميزانية (self._astar_search) بنفس
+        الحالات المزارة والمفتوحة بدلاً من البدء من الحالة الأولى، مع إعادة
+        حساب التقديرات بالوزن الجديد.
+        """
+        if resume:
+            (real_start_key, nodes, node_ids, best_cost, open_heap, counter,
+             best_progress, known, upper, incumbent) = self._astar_search
+            self._astar_search = None
+            open_heap = [(-neg_cost + weight * encoder.lower_bound(key), neg_cost, order, key, node_id, lasts)
+                         for _, neg_cost, order, key, node_id, lasts in open_heap]
+            heapq.heapify(open_heap)
+            self._visited = node_ids
+        else:
+            counter = itertools.count()
+            start_key, real_start_key = self._normalize(start_key), start_key
+            
+            # الحالة -> رقمها، وأقل تكلفة لكل رقم في مصفوفة بجانب شجرة البحث
+            nodes = NodeStore()
+            node_ids = {start_key: nodes.add()}
+            best_cost = array('H', [0])
+            self._visited = node_ids
             
-            # توليد الحالات التالية
-            for from_idx in range(current_state.num_bottles):
-                for to_idx in range(current_state.num_bottles):
-                    if current_state.can_pour(from_idx, to_idx):
-                        new_state = current_state.copy()
-                        new_state.pour(from_idx, to_idx)
-                        new_tuple = new_state.to_tuple()
-                        
-                        if new_tuple not in visited:
-                            visited.add(new_tuple)
-                            queue.append(new_state)
-                            parent[new_tuple] = current_tuple
-                            move[new_tuple] = (from_idx, to_idx)
+            # أفضل حالة موسعة (أقل حد أدنى ثم الأعمق) يستخدمها hint إذا انتهت المهلة
+            best_progress = (math.inf, 0)
+            self._astar_progress = (nodes, 0)
+            
+            # أفضل حل معروف حتى الآن عبر حالة من known: (طوله، تلك الحالة ورقمها)
+            known = known or {}
+            upper, incumbent = math.inf, None
+            if start_key in known:
+                upper, incumbent = len(known[start_key][1]), (start_key, 0)
+            
+            # (التقدير الكلي، -التكلفة، ترتيب الإدخال، الحالة، رقمها، آخر صبة)
+            # التكلفة السالبة تفضل الحالات الأعمق عند تساوي التقدير
+            open_heap = [(weight * encoder.lower_bound(start_key), 0, next(counter), start_key, 0, ())]
+        
+        while open_heap:
+            entry = heapq.heappop(open_heap)
+            estimate, neg_cost, _, current_key, current_id, lasts = entry
+            if estimate >= upper:
+                break  # لا يوجد حل أقصر من الحل المعروف
+            cost = -neg_cost
+            if cost > best_cost[current_id]:
+                continue  # نسخة قديمة من حالة وُجد لها طريق أقصر
+            # الحد الأدنى بدون الوزن حتى تبقى المقارنة صحيحة إذا أُكمل البحث بوزن آخر
+            progress = ((estimate - cost) / weight, -cost)
+            if progress < best_progress:
+                best_progress = progress
+                self._astar_progress = (nodes, current_id)
+            try:
+                self._tick(len(open_heap), cost)
+            except SearchBudgetExceeded:
+                # حفظ البحث كما هو (مع الحالة الحالية) ليكمله _run_fallback
+                heapq.heappush(open_heap, entry)
+                self._astar_search = (real_start_key, nodes, node_ids, best_cost, open_heap, counter,
+                                      best_progress, known, upper, incumbent)
+                raise
+            
+            if encoder.is_sorted(current_key):
+                return self._translate_moves(encoder, real_start_key, nodes.path(current_id))
+            
+            new_cost = cost + 1
+            for from_idx, to_idx, new_key, new_last in pruner.successors(current_key, lasts):
+                new_key = self._normalize(new_key)
+                new_id = node_ids.get(new_key)
+                if new_id is None:
+                    new_id = node_ids[new_key] = nodes.add(current_id, from_idx, to_idx)
+                    best_cost.append(new_cost)
+                elif new_cost < best_cost[new_id]:
+                    nodes.update(new_id, current_id, from_idx, to_idx)
+                    best_cost[new_id] = new_cost
+                else:
+                    self._duplicates += 1
+                    continue
+                
+                if new_key in known and new_cost + len(known[new_key][1]) < upper:
+                    upper, incumbent = new_cost + len(known[new_key][1]), (new_key, new_id)
+                estimate = new_cost + weight * encoder.lower_bound(new_key)
+                if estimate < upper:
+                    heapq.heappush(open_heap, (estimate, -new_cost, next(counter), new_key, new_id, (new_last,)))
         
+        if incumbent is not None:
+            return self._join_known(encoder, real_start_key, nodes, incumbent, known)
         return None  # لا يوجد حل
     
-    def _reconstruct_path(self, parent, move, goal_state):
-        """إعادة بناء مسار الحل"""
+    def _known_states(self, encoder):
+        """حالات مسار الحل السابق بشكلها القياسي -> (المفتاح الحقيقي، باقي الحل)"""
+        previous_state, previous = self._resume
+        if (previous_state.num_bottles != encoder.num_bottles
+                or previous_state.capacity != encoder.capacity):
+            return {}
+        
+        known = {}
+        current = previous_state.copy()
+        for index in range(len(previous) + 1):
+            try:
+                key = encoder.encode(current)
+            except ValueError:
+                return {}  # ألوان تغيرت (كشف طبقة مخفية مثلاً)
+            # الحالات الأقرب للنهاية تستبدل الأبعد إذا تكرر الشكل القياسي
+            known[self._normalize(key)] = (key, previous[index:])
+            if index < len(previous):
+                current.pour(*previous[index])
+        return known
+    
+    def _join_known(self, encoder, start_key, nodes, incumbent, known):
+        """الطريق إلى حالة من known متبوعاً بالحل المعروف منها"""
+        node, node_id = incumbent
+        prefix = self._translate_moves(encoder, start_key, nodes.path(node_id))
+        current_key = start_key
+        for from_idx, to_idx in prefix:
+            current_key = encoder.pour(current_key, from_idx, to_idx)
+        
+        # نفس الحالة بترتيب زجاجات مختلف: الزجاجة order_known[k] هي order_now[k]
+        known_key, suffix = known[node]
+        mapping = dict(zip(encoder.canonical_order(known_key), encoder.canonical_order(current_key)))
+        return prefix + [(mapping[from_idx], mapping[to_idx]) for from_idx, to_idx in suffix]
+    
+    def _solve_ida(self, encoder, pruner, start_key):
+        """IDA*: بحث بالعمق بحد متزايد، الذاكرة ثابتة مهما كان العمق
+        
+        الصب والتراجع يتمان في نفس قائمة قيم الزجاجات بدون نسخ، وجدول
+        التبديل محدود بـ table_size ويُفرغ مع كل حد جديد.
+        """
+        found = -1
+        bottles = encoder.split(start_key)
+        boundaries = encoder.bottle_boundaries
         path = []
-        current = goal_state
+        table = {}
         
-        while current in parent:
-            prev = parent[current]
-            if current in move:
-                path.append(move[current])
-            current = prev
+        def search(cost, estimate, bound, lasts):
+            if estimate == 0:  # لا حدود بين الألوان = مفروزة
+                return found
+            
+            # تجاهل حالة وصلناها سابقاً بتكلفة أقل أو مساوية في نفس الدورة
+            state_key = self._normalize(encoder.join(bottles))
+            seen_cost = table.get(state_key)
+            if seen_cost is not None and seen_cost <= cost:
+                self._duplicates += 1
+                return math.inf
+            
+            total = cost + estimate
+            if total > bound:
+                return total
+            self._tick(len(table), cost)
+            if seen_cost is not None or len(table) < self.table_size:
+                table[state_key] = cost
+            
+            next_bound = math.inf
+            for from_idx, to_idx, new_source, new_target, last in pruner.moves(bottles, lasts):
+                old_source = bottles[from_idx]
+                old_target = bottles[to_idx]
+                new_estimate = (estimate
+                                - boundaries(old_source) - boundaries(old_target)
+                                + boundaries(new_source) + boundaries(new_target))
+                
+                # صب في نفس المكان
+                bottles[from_idx] = new_source
+                bottles[to_idx] = new_target
+                path.append((from_idx, to_idx))
+                
+                result = search(cost + 1, new_estimate, bound, (last,))
+                if result == found:
+                    return found
+                
+                # التراجع عن الصب
+                path.pop()
+                bottles[from_idx] = old_source
+                bottles[to_idx] = old_target
+                next_bound = min(next_bound, result)
+            
+            return next_bound
+        
+        start_estimate = encoder.lower_bound(start_key)
+        bound = start_estimate
+        self._visited = table
+        while True:
+            self._note_visited()
+            table.clear()
+            result = search(0, start_estimate, bound, ())
+            if result == found:
+                return path
+            if result == math.inf:
+                return None  # لا يوجد حل
+            bound = result
+    
+    def _solve_external(self, encoder, pruner, start_key):
+        """BFS تُكتب طبقاته وحالاته المزارة على القرص بدلاً من الذاكرة"""
+        from .external import ExternalBFS
         
-        path.reverse()
-        return path
+        engine = ExternalBFS(encoder, pruner, self._normalize, tick=self._tick,
+                             directory=self.scratch_dir)
+        self._visited = engine
+        try:
+            path = engine.solve(start_key)
+        finally:
+            self._duplicates += engine.duplicates
+        if path is None:
+            return None  # لا يوجد حل
+        return self._translate_moves(encoder, start_key, path)
+    
+    def _solve_beam(self, encoder, pruner, start_key):
+        """بحث شعاعي: في كل عمق تبقى أفضل beam_width حالات فقط
+        
+        سريع وذاكرته محدودة للألغاز الكبيرة، لكن الحل غير مضمون الأقصر وقد
+        لا يجد حلاً موجوداً إذا خرجت كل الطرق إليه من الشعاع.
+        """
+        start_key, real_start_key = self._normalize(start_key), start_key
+        nodes = NodeStore()
+        visited = {start_key}
+        self._visited = visited
+        beam = [(start_key, nodes.add(), ())]
+        depth = 0
+        
+        while beam:
+            candidates = []
+            for current_key, current_id, lasts in beam:
+                self._tick(len(beam), depth)
+                if encoder.is_sorted(current_key):
+                    return self._translate_moves(encoder, real_start_key, nodes.path(current_id))
+                
+                for from_idx, to_idx, new_key, new_last in pruner.successors(current_key, lasts):
+                    new_key = self._normalize(new_key)
+                    if new_key in visited:
+                        self._duplicates += 1
+                        continue
+                    visited.add(new_key)
+                    new_id = nodes.add(current_id, from_idx, to_idx)
+                    candidates.append((self._beam_score(encoder, new_key), new_key, new_id, (new_last,)))
+            
+            best = heapq.nsmallest(self.beam_width, candidates, key=lambda candidate: candidate[0])
+            beam = [(key, node_id, lasts) for _, key, node_id, lasts in best]
+            depth += 1
+        
+        return None  # خرجت كل الطرق من الشعاع
+    
+    def _beam_score(self, encoder, key):
+        """ترتيب الحالة في البحث الشعاعي (الأصغر أفضل)"""
+        estimate = encoder.lower_bound(key)
+        if self.beam_heuristic == 'keep_empty':
+            # ملء الزجاجات الفارغة مبكراً يقود غالباً لطريق مسدود
+            return (estimate, -encoder.split(key).count(0))
+        return (estimate,)
+    
+    def _solve_vector(self, encoder, pruner, start_key):
+        """BFS بطبقات كاملة كمصفوفات NumPy (يتطلب numpy)"""
+        from .vectorized import VectorizedBFS
+        
+        engine = VectorizedBFS(encoder, self.symmetry, pruner.counts, tick=self._tick)
+        self._visited = engine
+        try:
+            path = engine.solve(start_key)
+        finally:
+            # الأبناء تُولد هنا كمصفوفات بدون المقلّم
+            pruner.generated += engine.generated
+            self._duplicates += engine.duplicates
+        if path is None:
+            return None  # لا يوجد حل
+        return self._translate_moves(encoder, start_key, path)
+    
+    def _translate_moves(self, encoder, start_key, path):
+        """تحويل حركات الأشكال القياسية إلى أرقام الزجاجات الحقيقية"""
+        if not self.symmetry:
+            return path
+        
+        moves = []
+        current_key = start_key
+        for from_idx, to_idx in path:
+            # الزجاجة رقم k في الشكل القياسي هي order[k] في الحالة الحقيقية
+            order = encoder.canonical_order(current_key)
+            real_move = (order[from_idx], order[to_idx])
+            current_key = encoder.pour(current_key, *real_move)
+            moves.append(real_move)
+        return moves
     
     def get_solution_steps(self):
-        """الحصول على خطوات الحل مع الوصف"""
+        """الحصول على خطوات الحل مع الوصف (تُبنى كل خطوة عند طلبها)"""
         if not self.solution:
             return []
-        
-        steps = []
-        current_state = self.initial_state.copy()
-        
-        for step_num, (from_idx, to_idx) in enumerate(self.solution, 1):
-            color = current_state.get_top_color(from_idx)
-            steps.append({
-                'step': step_num,
-                'from': from_idx,
-                'to': to_idx,
-                'color': color,
-                'state_before': current_state.copy()
-            })
-            current_state.pour(from_idx, to_idx)
-        
-        return steps
+        return SolutionSteps(self.initial_state, self.solution)
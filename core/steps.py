@@ -0,0 +1,63 @@
+from config import SOLUTION_CHECKPOINT_INTERVAL
+
+
+class SolutionSteps:
+    """خطوات الحل تُبنى عند الطلب بدلاً من نسخة كاملة من اللغز لكل خطوة
+    
+    تُحفظ الحركات ولون كل صبة ونسخة من الحالة كل interval خطوة فقط. الخطوة n
+    تُبنى بنسخ أقرب نقطة حفظ قبلها وإعادة الحركات منها، لذلك الوصول لأي خطوة
+    (السابقة أو القفز لرقم معين) لا يتجاوز interval صبة.
+    
+    كل خطوة قاموس بنفس شكل get_solution_steps القديم:
+    {'step', 'from', 'to', 'color', 'state_before'}
+    """
+    
+    def __init__(self, initial_state, moves, interval=SOLUTION_CHECKPOINT_INTERVAL):
+        self.moves = list(moves)
+        self.interval = max(1, interval)
+        self.checkpoints = [initial_state.copy()]
+        self.colors = []
+        
+        current_state = initial_state.copy()
+        for index, (from_idx, to_idx) in enumerate(self.moves, 1):
+            self.colors.append(current_state.get_top_color(from_idx))
+            current_state.pour(from_idx, to_idx)
+            if index % self.interval == 0 and index < len(self.moves):
+                self.checkpoints.append(current_state.copy())
+    
+    def __len__(self):
+        return len(self.moves)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('step index out of range')
+        return self._step(index, self.state_at(index))
+    
+    def __iter__(self):
+        """المرور على الخطوات بالترتيب بإعادة الحركات مرة واحدة (بدون الرجوع لنقاط الحفظ)"""
+        current_state = self.checkpoints[0].copy()
+        for index, (from_idx, to_idx) in enumerate(self.moves):
+            yield self._step(index, current_state.copy())
+            current_state.pour(from_idx, to_idx)
+    
+    def state_at(self, index):
+        """حالة اللغز قبل الحركة رقم index (يمكن أن يساوي عدد الحركات للحالة النهائية)"""
+        checkpoint = min(index // self.interval, len(self.checkpoints) - 1)
+        current_state = self.checkpoints[checkpoint].copy()
+        for from_idx, to_idx in self.moves[checkpoint * self.interval:index]:
+            current_state.pour(from_idx, to_idx)
+        return current_state
+    
+    def _step(self, index, state_before):
+        from_idx, to_idx = self.moves[index]
+        return {
+            'step': index + 1,
+            'from': from_idx,
+            'to': to_idx,
+            'color': self.colors[index],
+            'state_before': state_before
+        }
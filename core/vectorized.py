@@ -0,0 +1,184 @@
+import numpy as np
+
+
+class VectorizedBFS:
+    """BFS يعالج طبقة كاملة من الحالات كمصفوفة NumPy واحدة
+    
+    كل طبقة مصفوفة uint8 بأبعاد (الحالات × الزجاجات × السعة)، والطبقات
+    مخزنة من الأسفل للأعلى مثل StateEncoder، لذلك قيمة كل زجاجة هنا تساوي
+    قيمتها في المفتاح المضغوط والشكل القياسي هو نفسه.
+    """
+    
+    def __init__(self, encoder, symmetry=True, counts=None, chunk_size=50000, tick=None):
+        self.encoder = encoder
+        self.tick = tick  # tick(حجم الطبقة، العمق، عدد الحالات) لمراقبة الميزانية
+        self.symmetry = symmetry
+        self.counts = counts if counts is not None else {}
+        self.chunk_size = chunk_size
+        self.capacity = encoder.capacity
+        self.num_bottles = encoder.num_bottles
+        self.slots = np.arange(self.capacity)
+        self.shifts = (self.slots * encoder.bits).astype(np.int64)
+        self.not_self = ~np.eye(self.num_bottles, dtype=bool)
+        self.visited_count = 0
+        self.generated = 0
+        self.duplicates = 0  # أبناء مكررون أو مزارون سابقاً
+    
+    def __len__(self):
+        return self.visited_count
+    
+    def to_array(self, key):
+        """تحويل مفتاح مضغوط إلى مصفوفة حالة واحدة"""
+        encoder = self.encoder
+        states = np.zeros((1, self.num_bottles, self.capacity), dtype=np.uint8)
+        for bottle_idx, value in enumerate(encoder.split(key)):
+            for layer in range(self.capacity):
+                states[0, bottle_idx, layer] = (value >> (encoder.bits * layer)) & encoder.layer_mask
+        return states
+    
+    def _codes(self, states):
+        """قيمة كل زجاجة كعدد صحيح (نفس قيمة StateEncoder)"""
+        return (states.astype(np.int64) << self.shifts).sum(axis=2)
+    
+    def _canonical(self, states, codes):
+        """ترتيب الزجاجات في كل حالة حسب قيمتها"""
+        if not self.symmetry:
+            return states, codes
+        order = np.argsort(codes, axis=1, kind='stable')
+        codes = np.take_along_axis(codes, order, axis=1)
+        states = np.take_along_axis(states, order[..., None], axis=1)
+        return states, codes
+    
+    def _keys(self, codes):
+        """مفتاح ثابت الطول (void) لكل حالة يصلح للفرز والمقارنة"""
+        codes = np.ascontiguousarray(codes)
+        row_type = np.dtype((np.void, codes.dtype.itemsize * codes.shape[1]))
+        return codes.view(row_type).ravel()
+    
+    def _summaries(self, states):
+        """الارتفاع واللون العلوي وطول اللون العلوي لكل زجاجة في كل حالة"""
+        heights = (states != 0).sum(axis=2)
+        top_pos = np.maximum(heights - 1, 0)[..., None]
+        tops = np.take_along_axis(states, top_pos, axis=2)[..., 0]
+        
+        runs = np.zeros_like(heights)
+        alive = heights > 0
+        for depth in range(self.capacity):
+            pos = heights - 1 - depth
+            layer = np.take_along_axis(states, np.maximum(pos, 0)[..., None], axis=2)[..., 0]
+            alive = alive & (pos >= 0) & (layer == tops)
+            runs += alive
+        return heights, tops, runs
+    
+    def _legal_moves(self, heights, tops, runs):
+        """مصفوفة (الحالات × المصدر × الهدف) للصبات المسموحة بعد التقليم"""
+        empty = heights == 0
+        legal = ((heights > 0)[:, :, None]
+                 & (heights < self.capacity)[:, None, :]
+                 & (empty[:, None, :] | (tops[:, :, None] == tops[:, None, :]))
+                 & self.not_self)
+        
+        # نفس قواعد MovePruner المعتمدة على الحالة فقط
+        uniform = (runs == heights)[:, :, None] & empty[:, None, :] & legal
+        self._count('uniform_to_empty', uniform)
+        legal &= ~uniform
+        
+        first_empty = np.argmax(empty, axis=1)
+        other_empty = empty & (np.arange(self.num_bottles)[None, :] != first_empty[:, None])
+        duplicate = other_empty[:, None, :] & legal
+        self._count('duplicate_empty', duplicate)
+        legal &= ~duplicate
+        return legal
+    
+    def _count(self, rule, mask):
+        if rule in self.counts:
+            self.counts[rule] += int(mask.sum())
+    
+    def _expand(self, states):
+        """توليد كل الأبناء لمجموعة حالات دفعة واحدة"""
+        heights, tops, runs = self._summaries(states)
+        parents, sources, targets = np.nonzero(self._legal_moves(heights, tops, runs))
+        rows = np.arange(len(parents))
+        
+        amount = np.minimum(runs[parents, sources], self.capacity - heights[parents, targets])
+        children = states[parents]
+        
+        # إزالة الطبقات العلوية من المصدر
+        source_height = heights[parents, sources]
+        source_rows = children[rows, sources]
+        source_rows[(self.slots >= (source_height - amount)[:, None])
+                    & (self.slots < source_height[:, None])] = 0
+        children[rows, sources] = source_rows
+        
+        # إضافتها فوق محتوى الهدف
+        target_height = heights[parents, targets]
+        target_rows = children[rows, targets]
+        added = ((self.slots >= target_height[:, None])
+                 & (self.slots < (target_height + amount)[:, None]))
+        target_rows = np.where(added, tops[parents, sources][:, None], target_rows)
+        children[rows, targets] = target_rows
+        
+        return children, parents, sources, targets
+    
+    def _solved(self, states):
+        """أرقام الحالات المفروزة في الطبقة"""
+        heights, _, runs = self._summaries(states)
+        return np.nonzero((runs == heights).all(axis=1))[0]
+    
+    def solve(self, start_key):
+        """BFS طبقة بطبقة، يعيد الحركات بأرقام الشكل القياسي لكل حالة"""
+        frontier = self.to_array(start_key)
+        frontier, codes = self._canonical(frontier, self._codes(frontier))
+        visited = np.sort(self._keys(codes))
+        self.visited_count = len(visited)
+        layers = []  # لكل طبقة: (رقم الأب، المصدر، الهدف)
+        depth = 0
+        
+        while len(frontier):
+            solved = self._solved(frontier)
+            if len(solved):
+                return self._reconstruct_path(layers, int(solved[0]))
+            
+            next_states = []
+            next_moves = []
+            for offset in range(0, len(frontier), self.chunk_size):
+                chunk = frontier[offset:offset + self.chunk_size]
+                if self.tick:
+                    self.tick(len(frontier), depth, len(chunk))
+                children, parents, sources, targets = self._expand(chunk)
+                if not len(children):
+                    continue
+                
+                children, codes = self._canonical(children, self._codes(children))
+                keys = self._keys(codes)
+                self.generated += len(keys)
+                
+                # إزالة التكرار داخل الدفعة ثم مقارنة بكل الحالات السابقة
+                keys, first = np.unique(keys, return_index=True)
+                pos = np.minimum(np.searchsorted(visited, keys), len(visited) - 1)
+                new = visited[pos] != keys
+                keys = keys[new]
+                first = np.sort(first[new])
+                
+                visited = np.sort(np.concatenate([visited, keys]))
+                self.visited_count = len(visited)
+                self.duplicates += len(children) - len(keys)
+                next_states.append(children[first])
+                next_moves.append((parents[first] + offset, sources[first], targets[first]))
+            
+            if not next_states:
+                break
+            frontier = np.concatenate(next_states)
+            layers.append(tuple(np.concatenate(part) for part in zip(*next_moves)))
+            depth += 1
+        
+        return None  # لا يوجد حل
+    
+    def _reconstruct_path(self, layers, index):
+        """إعادة بناء المسار بالسير على أرقام الآباء من الطبقة الأخيرة"""
+        path = []
+        for parents, sources, targets in reversed(layers):
+            path.append((int(sources[index]), int(targets[index])))
+            index = int(parents[index])
+        path.reverse()
+        return path
@@ -0,0 +1,286 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Client, Listener
+
+from config import (SOLVER_SOCKET, SOLVER_WORKERS, SOLVER_REQUEST_TIMEOUT, SOLVER_METHOD,
+                    SOLVER_BEAM_WIDTH, SOLVER_SCRATCH_DIR, SOLVER_TIME_LIMIT, SOLVER_NODE_LIMIT,
+                    SOLVER_METRICS_LOG, SOLVER_TRACE_MEMORY)
+from core.puzzle import PuzzleState
+from core.solver import PuzzleSolver
+from core.cache import solution_cache
+from core.metrics import log_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _solve_in_worker(bottles, capacity):
+    """الحل داخل عملية من مجموعة العمليات (بدون ذاكرة مؤقتة)"""
+    solver = PuzzleSolver(
+        PuzzleState(bottles, capacity),
+        method=SOLVER_METHOD,
+        beam_width=SOLVER_BEAM_WIDTH,
+        scratch_dir=SOLVER_SCRATCH_DIR,
+        time_limit=SOLVER_TIME_LIMIT,
+        node_limit=SOLVER_NODE_LIMIT,
+        metrics_sink=log_metrics if SOLVER_METRICS_LOG else None,
+        trace_memory=SOLVER_TRACE_MEMORY
+    )
+    return solver.solve(), solver.optimal
+
+
+class SolverService:
+    """خدمة حل مشتركة لكل عمليات gunicorn عبر Unix socket
+    
+    عمليات الويب ترسل اللغز وتعود فوراً، والخدمة تحل في مجموعة عمليات
+    بعدد الأنوية وترسل النتيجة بنفسها عبر deliver(job, steps).
+    
+    - الطابور بأولوية: الرقم الأصغر أولاً، والأقدم عند التساوي
+    - لكل محادثة مهمة منتظرة واحدة: الطلب الجديد يستبدل القديم
+    - الذاكرة المؤقتة للحلول مشتركة لأنها في عملية الخدمة فقط
+    - موت عملية حل (نفاد الذاكرة مثلاً) يكسر المجموعة كلها، فتُستبدل بمجموعة
+      جديدة وتُعاد المهام المتأثرة للطابور مرة واحدة قبل اعتبارها فاشلة
+    """
+    
+    # عدد مرات إعادة مهمة فشلت بسبب موت عملية الحل
+    MAX_RETRIES = 1
+    
+    def __init__(self, deliver, address=SOLVER_SOCKET, workers=SOLVER_WORKERS, cache=solution_cache):
+        self.deliver = deliver
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # حفظ النتائج وإرسالها لتلجرام (عمليات حاجبة) خارج خيط مدير المجموعة
+        self.delivery = ThreadPoolExecutor(max_workers=self.workers)
+        
+        self.queue = []  # (الأولوية، الترتيب، chat_id)
+        self.pending = {}  # chat_id -> المهمة المنتظرة
+        self.generation = {}  # chat_id -> رقم آخر مهمة (لتجاهل النتائج القديمة)
+        self.running = 0
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'cached': 0, 'solved': 0, 'failed': 0,
+                      'pool_restarts': 0}
+    
+    def serve_forever(self):
+        """استقبال الطلبات وتشغيل موزع المهام"""
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        
+        with Listener(self.address, family='AF_UNIX') as listener:
+            logger.info(f"Solver service listening on {self.address} with {self.workers} workers")
+            while True:
+                try:
+                    conn = listener.accept()
+                except OSError as e:
+                    logger.error(f"Error accepting connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    def _handle(self, conn):
+        """معالجة طلب واحد: {'op': 'solve' | 'stats', ...}"""
+        with conn:
+            try:
+                request = conn.recv()
+                if request.get('op') == 'stats':
+                    conn.send(self.get_stats())
+                else:
+                    conn.send(self.submit(request))
+            except (EOFError, OSError) as e:
+                logger.error(f"Error handling request: {e}")
+    
+    def submit(self, job):
+        """إضافة مهمة للطابور وإرجاع حالتها: 'cached' أو 'queued' أو 'replaced'"""
+        chat_id = job['chat_id']
+        state = PuzzleState([list(bottle) for bottle in job['bottles']], job.get('capacity', 4))
+        
+        with self.condition:
+            self.stats['submitted'] += 1
+            job['generation'] = self.generation[chat_id] = self.generation.get(chat_id, 0) + 1
+        
+        cached = self.cache.get(state)
+        if cached is not None:
+            with self.condition:
+                self.stats['cached'] += 1
+                self.pending.pop(chat_id, None)
+            # الإرسال لتلجرام حاجب، فلا يؤخر الرد على عملية الويب
+            self.delivery.submit(self._finish, job, cached)
+            return 'cached'
+        
+        with self.condition:
+            replaced = chat_id in self.pending
+            self.pending[chat_id] = job
+            if replaced:
+                self.stats['deduplicated'] += 1
+            heapq.heappush(self.queue, (job.get('priority', 0), next(self.counter), chat_id))
+            self.condition.notify()
+        return 'replaced' if replaced else 'queued'
+    
+    def _dispatch_loop(self):
+        """إرسال المهام للعمليات كلما توفرت عملية فارغة"""
+        while True:
+            with self.condition:
+                while not self.queue or self.running >= self.workers:
+                    self.condition.wait()
+                _, _, chat_id = heapq.heappop(self.queue)
+                job = self.pending.pop(chat_id, None)
+                if job is None:  # مدخل قديم لمهمة استُبدلت أو حُلت من الذاكرة
+                    continue
+                self.running += 1
+            
+            pool = self.pool
+            try:
+                future = pool.submit(_solve_in_worker, job['bottles'], job.get('capacity', 4))
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                self._requeue(job)
+                continue
+            future.add_done_callback(lambda done, job=job, pool=pool: self._on_done(job, pool, done))
+    
+    def _restart_pool(self, broken):
+        """استبدال مجموعة عمليات مكسورة (مرة واحدة مهما كان عدد المهام المتأثرة)"""
+        with self.condition:
+            if self.pool is not broken:
+                return
+            logger.error("Solver process pool is broken, starting a new one")
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            self.stats['pool_restarts'] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+    
+    def _requeue(self, job):
+        """إعادة مهمة لم تبدأ أو ماتت عمليتها إلى الطابور، أو إفشالها بعد MAX_RETRIES"""
+        with self.condition:
+            self.running -= 1
+            retry = job.get('retries', 0) < self.MAX_RETRIES
+            if retry and job['chat_id'] not in self.pending:
+                job['retries'] = job.get('retries', 0) + 1
+                self.pending[job['chat_id']] = job
+                heapq.heappush(self.queue, (job.get('priority', 0), next(self.counter), job['chat_id']))
+            self.condition.notify()
+        if not retry:
+            self.delivery.submit(self._finish, job, None)
+    
+    def _on_done(self, job, pool, future):
+        """تسليم النتيجة لخيوط الإرسال (يُستدعى في خيط مدير المجموعة فلا يجب أن يحجب)"""
+        try:
+            solution, optimal = future.result()
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            self._requeue(job)
+            return
+        except Exception as e:
+            logger.error(f"Error solving puzzle for {job['chat_id']}: {e}")
+            solution, optimal = None, False
+        
+        with self.condition:
+            self.running -= 1
+            self.condition.notify()
+        self.delivery.submit(self._complete, job, solution, optimal)
+    
+    def _complete(self, job, solution, optimal):
+        """حفظ النتيجة في الذاكرة المؤقتة وإرسالها"""
+        state = PuzzleState([list(bottle) for bottle in job['bottles']], job.get('capacity', 4))
+        if solution is not None and optimal:
+            self.cache.put(state, solution)
+        self._finish(job, solution)
+    
+    def _finish(self, job, solution):
+        """تحويل الحل لخطوات وإرساله إذا كانت المهمة ما زالت الأحدث للمحادثة"""
+        with self.condition:
+            if self.generation.get(job['chat_id']) != job['generation']:
+                return
+            self.stats['solved' if solution is not None else 'failed'] += 1
+        
+        steps = None
+        if solution is not None:
+            solver = PuzzleSolver(PuzzleState([list(bottle) for bottle in job['bottles']],
+                                              job.get('capacity', 4)))
+            solver.solution = solution
+            steps = solver.get_solution_steps()
+        try:
+            self.deliver(job, steps)
+        except Exception as e:
+            logger.error(f"Error delivering solution to {job['chat_id']}: {e}")
+    
+    def get_stats(self):
+        """إحصائيات الخدمة والذاكرة المؤقتة المشتركة"""
+        with self.condition:
+            stats = dict(self.stats)
+            stats['queued'] = len(self.pending)
+            stats['running'] = self.running
+        stats['cache'] = self.cache.get_stats()
+        return stats
+
+
+def _request(message, address=SOLVER_SOCKET, timeout=SOLVER_REQUEST_TIMEOUT):
+    """إرسال طلب للخدمة وإرجاع (sent, reply)
+    
+    sent يكون False فقط إذا فشل الاتصال نفسه أو الإرسال (الخدمة لا تعمل).
+    reply يكون None إذا لم ترد الخدمة خلال timeout ثانية بعد استلام الطلب.
+    """
+    try:
+        conn = Client(address, family='AF_UNIX')
+    except OSError:
+        return False, None
+    with conn:
+        try:
+            conn.send(message)
+        except OSError:
+            return False, None
+        try:
+            if not conn.poll(timeout):
+                logger.error(f"Solver service did not reply within {timeout}s")
+                return True, None
+            return True, conn.recv()
+        except (OSError, EOFError) as e:
+            logger.error(f"Error reading solver service reply: {e}")
+            return True, None
+
+
+def submit_solve(chat_id, bottles, language, priority=0, capacity=4):
+    """إرسال لغز للخدمة، يعيد False إذا لم تكن الخدمة متاحة (للحل المباشر)
+    
+    بعد نجاح الإرسال تكون المهمة عند الخدمة حتى لو تأخر ردها، فلا يُحل مرة ثانية هنا.
+    """
+    sent, _ = _request({
+        'op': 'solve',
+        'chat_id': chat_id,
+        'bottles': bottles,
+        'capacity': capacity,
+        'language': language,
+        'priority': priority
+    })
+    return sent
+
+
+def get_service_stats():
+    """إحصائيات الخدمة (أو None إذا لم تكن تعمل أو لم ترد)"""
+    return _request({'op': 'stats'})[1]
+
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    from app import send_telegram_message, format_solution_message
+    from languages import LANGUAGES
+    
+    def deliver(job, steps):
+        lang_data = LANGUAGES.get(job.get('language', 'ar'), LANGUAGES['ar'])
+        if steps is None:
+            send_telegram_message(job['chat_id'], f"{lang_data['error']}\n\n{lang_data['next_game']}: /start")
+        else:
+            send_telegram_message(job['chat_id'], format_solution_message(steps, lang_data))
+    
+    SolverService(deliver).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,55 @@ def validate_puzzle_state(state):
     
     return True, "الحالة صالحة"
 
+def check_solvable(state, capacity=None):
+    """فحص سريع أن اللغز قابل للحل قبل البحث
+    
+    يرفض الحالات الميؤوس منها (قراءة صورة خاطئة أو خطأ في الإدخال اليدوي)
+    في أجزاء من الثانية بدلاً من استنفاد فضاء الحالات كاملاً.
+    """
+    from config import BOTTLE_CAPACITY
+    from core.puzzle import PuzzleState
+    from core.encoding import StateEncoder
+    
+    capacity = capacity or BOTTLE_CAPACITY
+    if not state or not isinstance(state, list):
+        return False, "الحالة غير صالحة"
+    
+    color_counts = {}
+    free_space = 0
+    for bottle in state:
+        if len(bottle) > capacity:
+            return False, f"زجاجة تحتوي على أكثر من {capacity} ألوان"
+        
+        colors = [color for color in bottle if color and color != 'EMPTY']
+        free_space += capacity - len(colors)
+        for color in colors:
+            color_counts[color] = color_counts.get(color, 0) + 1
+    
+    # كل لون يحتاج زجاجات كافية ليكون وحده
+    needed = sum(-(-count // capacity) for count in color_counts.values())
+    if needed > len(state):
+        return False, f"الألوان تحتاج {needed} زجاجات على الأقل والموجود {len(state)}"
+    
+    bottles = [['EMPTY'] * (capacity - len(bottle)) + list(bottle) for bottle in state]
+    puzzle = PuzzleState(bottles, capacity)
+    if puzzle.is_sorted():
+        return True, "اللغز مفروز بالفعل"
+    
+    if free_space == 0:
+        return False, "لا توجد مساحة فارغة لأي صبة"
+    
+    if not any(puzzle.can_pour(from_idx, to_idx)
+               for from_idx in range(puzzle.num_bottles)
+               for to_idx in range(puzzle.num_bottles)):
+        return False, "لا توجد أي صبة ممكنة"
+    
+    encoder = StateEncoder(puzzle)
+    if encoder.is_deadlocked(encoder.split(encoder.encode(puzzle))):
+        return False, "اللغز عالق: لا يمكن كشف الألوان السفلية بدون زجاجة فارغة"
+    
+    return True, "اللغز قابل للحل مبدئياً"
+
 def calculate_empty_bottles(state):
     """حساب عدد الزجاجات الفارغة"""
     empty_count = 0